@@ -0,0 +1,110 @@
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Iterator, Literal
+
+BreakerState = Literal["closed", "open", "half-open"]
+
+# Set by code paths that can do without the guarded dependency, e.g. endpoints that treat a cache outage as a miss
+_BYPASS_TOLERATED : contextvars.ContextVar[bool] = contextvars.ContextVar("bypass_tolerated", default=False)
+
+@contextlib.contextmanager
+def tolerate_bypass() -> Iterator[None]:
+    '''Within this block, calls rejected by an open circuit (or failing outright) are treated as misses instead of raising'''
+    token = _BYPASS_TOLERATED.set(True)
+    try:
+        yield
+    finally:
+        _BYPASS_TOLERATED.reset(token)
+
+def bypass_tolerated() -> bool:
+    return _BYPASS_TOLERATED.get()
+
+class CircuitBreaker:
+    '''### Circuit breaker guarding calls to a remote dependency
+
+    #### Usage
+    Check allow() before each call, then report its outcome through record_success() or record_failure(),
+    or through release_trial() if the call failed without reaching the dependency.
+    After failure_threshold consecutive failures the circuit opens, and calls are rejected without being attempted for cooldown seconds.
+    A single trial call is then let through (half-open), closing the circuit if it succeeds and reopening it otherwise'''
+
+    def __init__(self, failure_threshold : int = 5, cooldown : float = 10):
+        '''Initialize the breaker
+
+        params:
+
+        failure_threshold (int): Consecutive failures after which the circuit opens\n
+        cooldown (float): Seconds for which an open circuit rejects calls before letting a trial call through'''
+        if failure_threshold < 1:
+            raise ValueError("Failure threshold must be a positive integer")
+
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self._state : BreakerState = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> BreakerState:
+        return self._state
+
+    def allow(self) -> bool:
+        if self._state == "closed":
+            return True
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self._state = "half-open"
+            if self._state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            if self._state == "closed":
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        if self._state == "closed" and not self._failures:
+            return
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            self._state = "closed"
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == "half-open" or (self._state == "closed" and self._failures >= self.failure_threshold):
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self.times_opened += 1
+
+    def release_trial(self) -> None:
+        '''Report a call that says nothing about the dependency's health, letting another trial call through if it was the trial'''
+        if not self._trial_in_flight:
+            return
+        with self._lock:
+            self._trial_in_flight = False
+
+    def retry_after(self) -> float:
+        '''Seconds until an open circuit lets a trial call through'''
+        if self._state == "closed":
+            return 0
+        return max(self.cooldown - (time.monotonic() - self._opened_at), 0)
+
+    def stats(self) -> dict:
+        return {"state" : self._state,
+                "consecutive_failures" : self._failures,
+                "failure_threshold" : self.failure_threshold,
+                "cooldown" : self.cooldown,
+                "open_for" : time.monotonic() - self._opened_at if self._state != "closed" else None,
+                "rejected" : self.rejected,
+                "times_opened" : self.times_opened}
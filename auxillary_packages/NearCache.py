@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+class NearCache:
+    '''### Bounded, per-process LRU cache of Redis values, kept coherent through invalidation messages
+
+    #### Usage
+    Hand an instance to REDIS_MANAGER.enable_near_cache(), which serves reads of keys under the given prefixes from it
+    and evicts entries as Redis reports them modified. Entries also expire after ttl seconds, bounding staleness should an invalidation be lost.
+
+    Note: The cache only serves reads while its invalidation subscription is live, and is emptied whenever that subscription drops'''
+
+    def __init__(self, max_entries : int = 1024, ttl : float = 30):
+        '''Initialize the cache
+
+        params:
+
+        max_entries (int): Maximum number of cached keys, least recently used ones are evicted first\n
+        ttl (float): Seconds after which an entry is refetched from Redis regardless of invalidations'''
+        if max_entries < 1:
+            raise ValueError("Near cache size must be a positive integer")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = False
+
+        self._entries : OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation, so that values read from Redis before an invalidation are never cached after it
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key : str) -> tuple[bool, Any]:
+        '''Returns (True, value) on a hit, (False, None) otherwise'''
+        if not self.enabled:
+            return False, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key : str, value : Any, generation : int) -> None:
+        '''Cache a value read from Redis, unless an invalidation arrived since the read began (i.e. generation is outdated)'''
+        with self._lock:
+            if not self.enabled or generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys : Optional[Iterable[str]] = None) -> None:
+        '''Evict the given keys, or every key if None'''
+        with self._lock:
+            self._generation += 1
+            if keys is None:
+                self._entries.clear()
+                return
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        with self._lock:
+            self.enabled = False
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"enabled" : self.enabled, "entries" : len(self._entries), "max_entries" : self.max_entries, "hits" : self.hits, "misses" : self.misses}
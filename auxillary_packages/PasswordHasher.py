@@ -0,0 +1,82 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+import bcrypt
+from werkzeug.exceptions import ServiceUnavailable
+
+# Executed in worker processes, and so must stay importable without side effects
+
+def _hash(password : bytes, rounds : int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _check(pw_hash : bytes, password : bytes) -> bool:
+    return bcrypt.checkpw(password, pw_hash)
+
+def _noop() -> None:
+    return None
+
+def _as_bytes(value : str | bytes) -> bytes:
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+class PasswordHasher:
+    '''### Process pool for bcrypt hashing and verification, keeping their CPU time off the request workers' GIL
+
+    #### Usage
+    Call hash_password() and check_password() in place of Flask-Bcrypt. At most max_pending operations may be queued or running at once,
+    beyond which callers immediately receive 503 with a Retry-After header instead of queueing behind a login storm
+
+    Note: It is best if only a single instance of this class is active, started before the process spawns any threads'''
+
+    def __init__(self, rounds : int = 12, workers : Optional[int] = None, max_pending : Optional[int] = None, timeout : float = 10, retry_after : int = 1):
+        '''Initialize the hasher
+
+        params:
+
+        rounds (int): bcrypt cost factor of newly generated hashes\n
+        workers (int): Number of worker processes, defaults to the number of cores\n
+        max_pending (int): Maximum operations queued or running at once, defaults to 4 per worker\n
+        timeout (float): Seconds to wait on a single operation\n
+        retry_after (int): Seconds clients are asked to wait when the hasher is overloaded'''
+        self.rounds = rounds
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max_pending or self.workers * 4)
+        # Workers are forked, so that they do not re-import the application the way spawned processes would
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("fork"))
+
+    def start(self) -> None:
+        '''Fork every worker process up front, before the application starts any threads of its own'''
+        self._executor.submit(_noop).result()
+
+    def hash_password(self, password : str) -> str:
+        return self._run(_hash, _as_bytes(password), self.rounds).decode("utf-8")
+
+    def check_password(self, pw_hash : str | bytes, password : str) -> bool:
+        return self._run(_check, _as_bytes(pw_hash), _as_bytes(password))
+
+    def needs_rehash(self, pw_hash : str | bytes) -> bool:
+        '''Whether a hash was generated with a cost factor other than the current one. bcrypt hashes are formatted as $2b$<cost>$<salt and digest>'''
+        try:
+            return int(_as_bytes(pw_hash).split(b"$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise ServiceUnavailable("Too many authentication requests, please retry shortly", retry_after=self.retry_after)
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception as e:
+            self._slots.release()
+            raise e
+
+        # The slot is held until the operation finishes, even if this caller stops waiting on it
+        future.add_done_callback(lambda _ : self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise ServiceUnavailable("Authentication timed out, please retry shortly", retry_after=self.retry_after)
@@ -1,13 +1,116 @@
 import functools
-from typing import Literal, Any, Iterable
-from redis import Redis
+import hashlib
+import math
+import os
+import threading
+import time
+from typing import Literal, Any, Iterable, Optional
+from redis import Redis, ConnectionPool, BlockingConnectionPool
+from redis.client import Pipeline
 import redis.exceptions as RedisExceptions
 from redis.typing import ResponseT
+from werkzeug.exceptions import ServiceUnavailable
+from auxillary_packages.NearCache import NearCache
+from auxillary_packages.CircuitBreaker import CircuitBreaker, bypass_tolerated
+
+# Channel carrying modified keys when Redis lacks CLIENT TRACKING, published to by REDIS_MANAGER's own writes
+NEAR_CACHE_CHANNEL = "nc:invalidate"
+TRACKING_CHANNEL = "__redis__:invalidate"
+
+# Releases a key (e.g. a lock) only while it still holds the value its owner set it to
+DELETE_IF_EQUALS_SCRIPT = '''if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0'''
+
+def _report_error(manager : "REDIS_MANAGER", e : Exception) -> None:
+    '''Log a failed Redis operation, and raise if the manager's error policy is strict and the caller does not tolerate a bypass'''
+    if isinstance(e, RedisExceptions.ConnectionError):
+        # Logs for connection-related errors
+        print(f"[Redis Error - ConnectionError] Failed to connect to Redis server. Details: {str(e)}")
+    elif isinstance(e, RedisExceptions.TimeoutError):
+        # Logs for timeout errors
+        print(f"[Redis Error - TimeoutError] Redis operation timed out. Details: {str(e)}")
+    elif isinstance(e, RedisExceptions.RedisError):
+        # Logs for general Redis errors
+        print(f"[Redis Error - RedisError] An unexpected Redis error occurred. Details: {str(e)}")
+    else:
+        # Fallback for unexpected issues
+        print(f"[Redis Error - Unknown] An unknown error occurred. Details: {str(e)}")
+
+    if manager.err_behavior == "strict" and not bypass_tolerated():
+        e = RedisExceptions.RedisError()
+        e.__setattr__("description", "Raising error, error_policy = strict")
+        raise e
+
+def connection_options_from_env() -> dict:
+    '''Connection pool sizing, socket timeouts and keepalive for REDIS_MANAGER, read from environment variables'''
+    return {"max_connections" : int(os.environ["REDIS_MAX_CONNECTIONS"]) if os.environ.get("REDIS_MAX_CONNECTIONS") else None,
+            "pool_timeout" : float(os.environ.get("REDIS_POOL_TIMEOUT", 2)),
+            "socket_timeout" : float(os.environ.get("REDIS_SOCKET_TIMEOUT", 2)),
+            "socket_connect_timeout" : float(os.environ.get("REDIS_SOCKET_CONNECT_TIMEOUT", 2)),
+            "socket_keepalive" : os.environ.get("REDIS_SOCKET_KEEPALIVE", "true").lower() in ("1", "true", "yes"),
+            "health_check_interval" : int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", 30))}
+
+class PoolExhaustedError(RedisExceptions.ConnectionError):
+    '''No pooled connection became free within the pool timeout. Raised by this process running out of connections, not by Redis being unreachable'''
+
+class BoundedConnectionPool(BlockingConnectionPool):
+    '''Connection pool capped at max_connections, where callers wait up to timeout seconds for a connection to be released instead of failing right away'''
+
+    def get_connection(self, *args, **kwargs):
+        try:
+            return super().get_connection(*args, **kwargs)
+        except RedisExceptions.ConnectionError as e:
+            # BlockingConnectionPool reports an empty pool and a failed connect with the same exception type
+            if str(e) == "No connection available.":
+                raise PoolExhaustedError(f"No Redis connection was released within {self.timeout} seconds") from e
+            raise
+
+class SafePipeline:
+    '''### Pipeline subject to the error policy of the REDIS_MANAGER that created it
+
+    #### Usage
+    Queue commands inside `with RedisManager.pipeline() as pipe: ...`, they are sent in a single round trip when the block exits.
+    Replies are available afterwards as pipe.results, which is None if the pipeline failed (or was short-circuited) under the lax policy or a tolerated bypass'''
+
+    def __init__(self, manager : "REDIS_MANAGER", transaction : bool = False) -> None:
+        self._manager = manager
+        self._pipeline : Pipeline = manager._interface.pipeline(transaction=transaction)
+        self.results : Optional[list] = None
+
+    def __getattr__(self, command : str) -> Any:
+        return getattr(self._pipeline, command)
+
+    def __enter__(self) -> "SafePipeline":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        try:
+            if exc_type is None:
+                self.results = self._manager._call(self._pipeline.execute)
+        finally:
+            self._pipeline.reset()
+        return False
 
 class REDIS_MANAGER:
-    def __init__(self, host : str, port : int, db : int, startup_mandate : bool = True, error_behavior : Literal["lax", "strict"] = "strict", **kwargs):
+    def __init__(self, host : str, port : int, db : int, startup_mandate : bool = True, error_behavior : Literal["lax", "strict"] = "strict",
+                 max_connections : Optional[int] = None, pool_timeout : Optional[float] = None, socket_timeout : Optional[float] = None, socket_connect_timeout : Optional[float] = None,
+                 socket_keepalive : bool = False, health_check_interval : int = 0, circuit_breaker : Optional[CircuitBreaker] = None, **kwargs):
         try:
-            self._interface = Redis(host, int(port), int(db), **kwargs)
+            options : dict = dict(host=host, port=int(port), db=int(db),
+                                  socket_connect_timeout=socket_connect_timeout,
+                                  socket_keepalive=socket_keepalive,
+                                  health_check_interval=health_check_interval,
+                                  **kwargs)
+            # A capped pool makes callers queue for connections, rather than fail with "Too many connections" under bursts
+            if max_connections:
+                self._pool = BoundedConnectionPool(max_connections=max_connections, timeout=pool_timeout, socket_timeout=socket_timeout, **options)
+            else:
+                self._pool = ConnectionPool(socket_timeout=socket_timeout, **options)
+            self._interface = Redis(connection_pool=self._pool)
+            # Subscribers block on reads indefinitely, and so must not share the socket timeout of regular commands
+            self._subscriber_pool = ConnectionPool(socket_timeout=None, **options)
             if startup_mandate and not self._interface.ping():
                 raise ConnectionError("Redis Connection could not be established")
             elif not (startup_mandate or self._interface.ping()):
@@ -17,47 +120,237 @@ class REDIS_MANAGER:
             raise ConnectionError("Failed to access cache banks")
         
         self.err_behavior = error_behavior
-    def safe(func):
-        @functools.wraps(func)
-        def decorated(*args, **kwargs):
+        self._breaker = circuit_breaker
+        # Sources of loaded Lua scripts by SHA1 digest, for reloading them should the server's script cache be flushed
+        self._scripts : dict[str, str] = {}
+        self._delete_if_equals_sha : str = hashlib.sha1(DELETE_IF_EQUALS_SCRIPT.encode()).hexdigest()
+        self._scripts[self._delete_if_equals_sha] = DELETE_IF_EQUALS_SCRIPT
+        self._near_cache : Optional[NearCache] = None
+        self._near_prefixes : tuple[str, ...] = ()
+        self._near_tracking : bool = True
+
+    def enable_near_cache(self, cache : NearCache, prefixes : Iterable[str]) -> None:
+        '''Serve GETs of keys under the given prefixes from an in-process cache, invalidated through CLIENT TRACKING in broadcasting mode.
+        Falls back to invalidations published by REDIS_MANAGER's own writes if the server does not support tracking'''
+        self._near_cache = cache
+        self._near_prefixes = tuple(prefixes)
+        threading.Thread(target=self._listen_for_invalidations, name="near-cache-invalidations", daemon=True).start()
+
+    def near_cache_stats(self) -> Optional[dict]:
+        return self._near_cache.stats() if self._near_cache else None
+
+    def _near_cached(self, name : str) -> bool:
+        return self._near_cache is not None and name.startswith(self._near_prefixes)
+
+    def _near_invalidate(self, names : Iterable[str]) -> None:
+        names = [name for name in names if self._near_cached(name)]
+        if not names:
+            return
+        self._near_cache.invalidate(names)
+        if not self._near_tracking:
+            for name in names:
+                self._interface.execute_command("PUBLISH", NEAR_CACHE_CHANNEL, name)
+
+    def _listen_for_invalidations(self) -> None:
+        while True:
+            subscriber = tracker = None
             try:
-                return func(*args, **kwargs)
-            except RedisExceptions.ConnectionError as e:
-                # Logs for connection-related errors
-                print(f"[Redis Error - ConnectionError] Failed to connect to Redis server. Details: {str(e)}")
-            except RedisExceptions.TimeoutError as e:
-                # Logs for timeout errors
-                print(f"[Redis Error - TimeoutError] Redis operation timed out. Details: {str(e)}")
-            except RedisExceptions.RedisError as e:
-                # Logs for general Redis errors
-                print(f"[Redis Error - RedisError] An unexpected Redis error occurred. Details: {str(e)}")
+                subscriber = self._subscriber_pool.get_connection("SUBSCRIBE")
+                subscriber.send_command("CLIENT", "ID")
+                subscriberID = subscriber.read_response()
+                tracker = self._subscriber_pool.get_connection("CLIENT")
+                try:
+                    # Tracking lasts as long as the tracker's connection, which is therefore held until the subscription drops
+                    prefixes = [arg for prefix in self._near_prefixes for arg in ("PREFIX", prefix)]
+                    tracker.send_command("CLIENT", "TRACKING", "ON", "REDIRECT", subscriberID, "BCAST", *prefixes)
+                    tracker.read_response()
+                    self._near_tracking = True
+                except RedisExceptions.ResponseError:
+                    self._near_tracking = False
+
+                subscriber.send_command("SUBSCRIBE", TRACKING_CHANNEL if self._near_tracking else NEAR_CACHE_CHANNEL)
+                subscriber.read_response()
+                self._near_cache.enable()
+                while True:
+                    message = subscriber.read_response()
+                    if message[0] != b"message":
+                        continue
+                    # Tracking reports a flush of the whole database as a null list of keys
+                    keys = message[2]
+                    if keys is None:
+                        self._near_cache.invalidate()
+                    else:
+                        self._near_cache.invalidate([key.decode() for key in keys] if isinstance(keys, list) else [keys.decode()])
             except Exception as e:
-                # Fallback for unexpected issues
-                print(f"[Redis Error - Unknown] An unknown error occurred. Details: {str(e)}")
+                print(f"[Near Cache] Lost invalidation subscription, bypassing near cache until resubscribed. Details: {str(e)}")
+            finally:
+                # Invalidations may have been missed, so nothing cached so far can be trusted
+                self._near_cache.disable()
+                for connection in (subscriber, tracker):
+                    if connection is not None:
+                        connection.disconnect()
+                        self._subscriber_pool.release(connection)
+            time.sleep(1)
+
+    def _get_bytes(self, name : str) -> bytes | None:
+        if not self._near_cached(name):
+            return self._interface.execute_command("GET", name)
+
+        hit, value = self._near_cache.get(name)
+        if hit:
+            return value
+        generation = self._near_cache.generation()
+        value = self._interface.execute_command("GET", name)
+        if value is not None:
+            self._near_cache.put(name, value, generation)
+        return value
+
+    def _mget_bytes(self, names : Iterable[str]) -> list[bytes | None]:
+        names = list(names)
+        if self._near_cache is None:
+            return self._interface.execute_command("MGET", *names)
+
+        results : list = [None] * len(names)
+        missing : list[int] = []
+        for i, name in enumerate(names):
+            hit, value = self._near_cache.get(name) if self._near_cached(name) else (False, None)
+            if hit:
+                results[i] = value
+            else:
+                missing.append(i)
 
-            if args[0].err_behavior == "strict":
-                e = RedisExceptions.RedisError()
-                e.__setattr__("description", "Raising error, error_policy = strict")
-                raise e
+        if missing:
+            generation = self._near_cache.generation()
+            for i, value in zip(missing, self._interface.execute_command("MGET", *(names[i] for i in missing))):
+                results[i] = value
+                if value is not None and self._near_cached(names[i]):
+                    self._near_cache.put(names[i], value, generation)
+        return results
+
+    def breaker_stats(self) -> Optional[dict]:
+        return self._breaker.stats() if self._breaker else None
+
+    def _admit(self) -> bool:
+        '''Whether a call may be sent to Redis. While the circuit is open, callers that do not tolerate a bypass fail fast under the strict policy'''
+        if self._breaker is None or self._breaker.allow():
+            return True
+        if self.err_behavior == "strict" and not bypass_tolerated():
+            raise ServiceUnavailable("Cache service unavailable, please retry shortly", retry_after=math.ceil(self._breaker.retry_after()))
+        return False
+
+    def _call(self, func, *args, **kwargs) -> Any:
+        if not self._admit():
+            return None
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if self._breaker:
+                # Only an unreachable or unresponsive server counts against the circuit, error replies prove it alive.
+                # Running out of pooled connections says nothing about the server either way
+                if isinstance(e, PoolExhaustedError):
+                    self._breaker.release_trial()
+                elif isinstance(e, (RedisExceptions.ConnectionError, RedisExceptions.TimeoutError)):
+                    self._breaker.record_failure()
+                else:
+                    self._breaker.record_success()
+            _report_error(self, e)
+            return None
+        if self._breaker:
+            self._breaker.record_success()
+        return result
 
-            return None 
+    def safe(func):
+        @functools.wraps(func)
+        def decorated(*args, **kwargs):
+            return args[0]._call(func, *args, **kwargs)
         return decorated
 
     @safe
     def setex(self, name : str | int, exp : int, value : str | int) -> None:
         self._interface.execute_command("SETEX", name, exp, value)
+        self._near_invalidate((str(name),))
 
     @safe
-    def delete(self, name) -> None:
-        self._interface.execute_command("DEL", name)
+    def set(self, name : str, value : str | bytes, ex : int | None = None, nx : bool = False) -> bool:
+        args : list = ["SET", name, value]
+        if ex:
+            args.extend(("EX", ex))
+        if nx:
+            args.append("NX")
+        result = bool(self._interface.execute_command(*args))
+        self._near_invalidate((name,))
+        return result
+
+    @safe
+    def mset_ex(self, mapping : dict[str, str | bytes], exp : int) -> None:
+        '''SETEX every key of the mapping with the same expiry, in a single round trip'''
+        pipeline = self._interface.pipeline(transaction=False)
+        for name, value in mapping.items():
+            pipeline.execute_command("SETEX", name, exp, value)
+        pipeline.execute()
+        self._near_invalidate(mapping)
+
+    @safe
+    def delete(self, *names : str) -> int:
+        if not names:
+            return 0
+        result = self._interface.execute_command("DEL", *names)
+        self._near_invalidate(names)
+        return result
+
+    @safe
+    def delete_if_equals(self, name : str, value : str | bytes) -> bool:
+        '''DEL a key only if it holds the given value, so that an owner whose hold expired never releases someone else's'''
+        try:
+            result = self._interface.execute_command("EVALSHA", self._delete_if_equals_sha, 1, name, value)
+        except RedisExceptions.NoScriptError:
+            result = self._interface.execute_command("EVAL", DELETE_IF_EQUALS_SCRIPT, 1, name, value)
+        self._near_invalidate((name,))
+        return bool(result)
 
     @safe
     def get(self, name : str) -> ResponseT | None:
-        result = self._interface.execute_command("GET", name)
+        result = self._get_bytes(name)
         if result != None:
             return result.decode("utf-8") if isinstance(result, bytes) else result
         return None
 
+    @safe
+    def get_raw(self, name : str) -> bytes | None:
+        '''GET without decoding, for payloads that are served verbatim'''
+        return self._get_bytes(name)
+
+    @safe
+    def mget_raw(self, names : Iterable[str]) -> list[bytes | None]:
+        return self._mget_bytes(names)
+
+    @safe
+    def mget(self, names : Iterable[str]) -> list[ResponseT | None]:
+        return [result.decode("utf-8") if isinstance(result, bytes) else result
+                for result in self._mget_bytes(names)]
+
+    @safe
+    def incrby(self, name : str, amount : int = 1) -> int:
+        return self._interface.execute_command("INCRBY", name, amount)
+
+    @safe
+    def rename(self, name : str, new_name : str) -> None:
+        self._interface.execute_command("RENAME", name, new_name)
+
+    @safe
+    def hincrby(self, name : str, key : str, amount : int = 1) -> int:
+        return self._interface.execute_command("HINCRBY", name, key, amount)
+
+    @safe
+    def hmget(self, name : str, keys : Iterable[str]) -> list[ResponseT | None]:
+        return [result.decode("utf-8") if isinstance(result, bytes) else result
+                for result in self._interface.execute_command("HMGET", name, *keys)]
+
+    @safe
+    def hgetall(self, name : str) -> dict[bytes, bytes]:
+        '''HGETALL, fields and values are returned as raw bytes'''
+        return self._interface.hgetall(name)
+
     @safe
     def lpush(self, name : str, val : str | Iterable[str]) -> None:
         if isinstance(val, str):
@@ -66,6 +359,24 @@ class REDIS_MANAGER:
         
         self._interface.execute_command("LPUSH", name, *val)
 
+    @safe
+    def rpush(self, name : str, val : str | Iterable[str]) -> int:
+        if isinstance(val, str):
+            return self._interface.execute_command("RPUSH", name, val)
+        
+        return self._interface.execute_command("RPUSH", name, *val)
+
+    @safe
+    def lpop(self, name : str) -> ResponseT | None:
+        result = self._interface.execute_command("LPOP", name)
+        if result != None:
+            return result.decode("utf-8") if isinstance(result, bytes) else result
+        return None
+
+    @safe
+    def lrem(self, name : str, count : int, val : str) -> int:
+        return self._interface.execute_command("LREM", name, count, val)
+
     @safe
     def rpop(self, name : str, count : int = 1) -> Any:
         return self._interface.execute_command("RPOP", name, count)
@@ -82,9 +393,70 @@ class REDIS_MANAGER:
         return self._interface.execute_command("LLEN", name)
     
     @safe
-    def create_pipeline(self):
-        return self._interface.pipeline()
-    
+    def publish(self, channel : str, message : str | bytes) -> int:
+        return self._interface.execute_command("PUBLISH", channel, message)
+
+    def load_script(self, source : str) -> str:
+        '''SCRIPT LOAD a Lua script, returning the SHA1 digest to run it by through evalsha'''
+        sha : str = hashlib.sha1(source.encode()).hexdigest()
+        self._scripts[sha] = source
+        self._call(self._interface.execute_command, "SCRIPT", "LOAD", source)
+        return sha
+
+    @safe
+    def evalsha(self, sha : str, keys : Iterable[str], args : Iterable[str | int | float | bytes]) -> Any:
+        '''Run a script loaded through load_script, atomically and in a single round trip'''
+        keys, args = list(keys), list(args)
+        try:
+            return self._interface.execute_command("EVALSHA", sha, len(keys), *keys, *args)
+        except RedisExceptions.NoScriptError:
+            # Script cache was flushed, e.g. by a server restart
+            self._interface.execute_command("SCRIPT", "LOAD", self._scripts[sha])
+            return self._interface.execute_command("EVALSHA", sha, len(keys), *keys, *args)
+
+    def pubsub(self):
+        return Redis(connection_pool=self._subscriber_pool).pubsub(ignore_subscribe_messages=True)
+
+    def pipeline(self, transaction : bool = False) -> SafePipeline:
+        '''Context-managed pipeline, MULTI/EXEC wrapped if transaction is set. Failures follow this manager's error policy'''
+        return SafePipeline(self, transaction)
+
+    @safe
+    def zadd(self, name : str, mapping : dict) -> int:
+        args : list = []
+        for member, score in mapping.items():
+            args.extend((score, member))
+        return self._interface.execute_command("ZADD", name, *args)
+
+    @safe
+    def zcard(self, name : str) -> int:
+        return self._interface.execute_command("ZCARD", name)
+
+    @safe
+    def zscore(self, name : str, member : str) -> float | None:
+        result = self._interface.execute_command("ZSCORE", name, member)
+        return float(result) if result is not None else None
+
+    @safe
+    def zrange_byscore(self, name : str, start : int | float | str, stop : int | float | str, rev : bool = False, offset : int = 0, count : int | None = None) -> list[tuple[bytes, float]]:
+        '''ZRANGE ... BYSCORE WITHSCORES, members are returned as raw bytes. With rev, start is the upper bound'''
+        args : list = ["ZRANGE", name, start, stop, "BYSCORE"]
+        if rev:
+            args.append("REV")
+        if count is not None:
+            args.extend(("LIMIT", offset, count))
+        args.append("WITHSCORES")
+        result = self._interface.execute_command(*args)
+        return list(zip(result[::2], map(float, result[1::2])))
+
+    @safe
+    def exists(self, name : str) -> int:
+        return self._interface.execute_command("EXISTS", name)
+
+    @safe
+    def expire(self, key : str, seconds : int) -> None:
+        self._interface.execute_command("EXPIRE", key, seconds)
+
     @safe
     def expireat(self, key : str, exp : int | float) -> None:
         self._interface.execute_command("EXPIREAT", key, exp)
\ No newline at end of file
@@ -0,0 +1,128 @@
+import contextlib
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional
+
+from auxillary_packages.errors import API_TIMEOUT_ERROR
+
+class _PooledClient:
+    __slots__ = ("client", "last_used")
+
+    def __init__(self, client : Any) -> None:
+        self.client = client
+        self.last_used = time.monotonic()
+
+class TranslatorPool:
+    '''### Process-wide pool of translator clients, each holding on to its own keep-alive HTTP connections
+
+    #### Usage
+    Borrow a client with `with pool.borrow() as translator: ...`. Clients are handed out in LIFO order so that the warmest connections are reused,
+    built lazily on first use, and rebuilt if they raised during use or sat idle for longer than max_idle seconds.
+    Clients idle for longer than probe_after seconds are probed with a HEAD request over their own connections before being handed out,
+    and rebuilt if the probe fails
+
+    Note: It is best if only a single instance of this class is active'''
+
+    def __init__(self, factory : Callable[[], Any], size : int = 8, borrow_timeout : float = 5, max_idle : float = 300,
+                 probe_after : Optional[float] = 30, probe_timeout : float = 2):
+        '''Initialize the pool
+
+        params:
+
+        factory (callable): Builds a new translator client, e.g. googletrans.Translator\n
+        size (int): Maximum number of clients, and thus concurrent upstream calls, in this process\n
+        borrow_timeout (float): Seconds to wait for a client when all of them are borrowed\n
+        max_idle (float): Seconds after which an unused client's connections are considered stale\n
+        probe_after (float): Seconds after which an unused client is probed before being handed out, None to never probe\n
+        probe_timeout (float): Seconds to wait on a probe before considering the client dead'''
+        if size < 1:
+            raise ValueError("Translator pool size must be a positive integer")
+
+        self.factory = factory
+        self.size = size
+        self.borrow_timeout = borrow_timeout
+        self.max_idle = max_idle
+        self.probe_after = probe_after
+        self.probe_timeout = probe_timeout
+
+        # Empty slots (None) are filled on first borrow, so that startup does not pay for unused clients
+        self._idle : queue.LifoQueue[Optional[_PooledClient]] = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._idle.put(None)
+
+        self._lock = threading.Lock()
+        self.created = 0
+        self.discarded = 0
+        self.probes_failed = 0
+
+    @contextlib.contextmanager
+    def borrow(self) -> Iterator[Any]:
+        try:
+            pooled = self._idle.get(timeout=self.borrow_timeout)
+        except queue.Empty:
+            raise API_TIMEOUT_ERROR(endpoint="translator pool", description="Timeout reached waiting on a client from the {}")
+
+        try:
+            if pooled is None or not self._healthy(pooled):
+                if pooled is not None:
+                    self._discard(pooled)
+                pooled = self._create()
+        except Exception as e:
+            self._idle.put(None)
+            raise e
+
+        try:
+            yield pooled.client
+        except Exception as e:
+            # Failed clients may hold broken connections, rebuild on next borrow
+            self._discard(pooled)
+            pooled = None
+            raise e
+        finally:
+            if pooled is not None:
+                pooled.last_used = time.monotonic()
+            self._idle.put(pooled)
+
+    def stats(self) -> dict:
+        return {"size" : self.size, "idle" : self._idle.qsize(), "created" : self.created, "discarded" : self.discarded, "probes_failed" : self.probes_failed}
+
+    def _healthy(self, pooled : _PooledClient) -> bool:
+        idle : float = time.monotonic() - pooled.last_used
+        if idle >= self.max_idle:
+            return False
+        if self.probe_after is not None and idle >= self.probe_after:
+            return self._probe(pooled)
+        return True
+
+    def _probe(self, pooled : _PooledClient) -> bool:
+        '''Whether the client's connections still reach the translation service. Any response will do, only transport failures count'''
+        # googletrans.Translator keeps its HTTP client under .client, and the hosts it translates through under .service_urls
+        http_client = getattr(pooled.client, "client", None)
+        if http_client is None or not hasattr(http_client, "head"):
+            return True
+        service_urls = getattr(pooled.client, "service_urls", None) or ("translate.google.com",)
+        try:
+            http_client.head(f"https://{service_urls[0]}", timeout=self.probe_timeout)
+        except Exception:
+            with self._lock:
+                self.probes_failed += 1
+            return False
+        return True
+
+    def _create(self) -> _PooledClient:
+        pooled = _PooledClient(self.factory())
+        with self._lock:
+            self.created += 1
+        return pooled
+
+    def _discard(self, pooled : _PooledClient) -> None:
+        with self._lock:
+            self.discarded += 1
+        # googletrans.Translator keeps its HTTP client under .client
+        http_client = getattr(pooled.client, "client", None)
+        try:
+            if http_client is not None and hasattr(http_client, "close"):
+                http_client.close()
+        except Exception:
+            pass
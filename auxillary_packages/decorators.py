@@ -1,10 +1,12 @@
-from jwt import decode, PyJWTError, ExpiredSignatureError
+from jwt import decode, PyJWTError, ExpiredSignatureError, MissingRequiredClaimError
 from flask import request, g, make_response, Response, jsonify, current_app
 import os
 from werkzeug.exceptions import Unauthorized, BadRequest, InternalServerError
 from datetime import timedelta
 import functools
+import hashlib
 import secrets, random
+from auxillary_packages.CircuitBreaker import tolerate_bypass
 
 def token_required(endpoint):
     '''
@@ -22,13 +24,17 @@ def token_required(endpoint):
                                 key=os.environ["SIGNING_KEY"],
                                 algorithms=["HS256"],
                                 issuer="babel-auth-service",
-                                leeway=timedelta(minutes=3)
+                                leeway=timedelta(minutes=3),
+                                options={"require" : ["exp", "sub", "uid"]}
             )
             g.decodedToken = decodedToken
         except KeyError as e:
             raise BadRequest(f"Endpoint /{request.path[1:]} requires an authorization token to give access to resource")
         except ExpiredSignatureError:
             raise Unauthorized("JWT token expired, begin refresh issuance")
+        except MissingRequiredClaimError:
+            # Tokens issued before user IDs were added as a claim cannot be refreshed into valid ones
+            raise Unauthorized("JWT token outdated, please log in again")
         except PyJWTError as e:
             raise Unauthorized("JWT token invalid")
         
@@ -152,4 +158,36 @@ def CSRF_protect(endpoint):
 
         # If not web client, business as usual
         return endpoint(*args, **kwargs)
-    return decorated
\ No newline at end of file
+    return decorated
+
+def conditional(cache_control : str, vary : str | None = None):
+    '''
+    Attach a strong ETag (SHA-256 of the body, unless the endpoint already set one) and the given Cache-Control to successful responses,
+    answering with 304 Not Modified when the request's If-None-Match matches
+    '''
+    def inner_dec(endpoint):
+        @functools.wraps(endpoint)
+        def decorated(*args, **kwargs):
+            response : Response = make_response(endpoint(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+
+            if not response.get_etag()[0]:
+                response.set_etag(hashlib.sha256(response.get_data()).hexdigest())
+            response.headers["Cache-Control"] = cache_control
+            if vary:
+                response.vary.add(vary)
+            return response.make_conditional(request)
+        return decorated
+    return inner_dec
+
+def tolerates_cache_bypass(endpoint):
+    '''
+    Declare that an endpoint can be served without Redis. While its circuit is open (or a call fails), cache reads within the endpoint
+    return misses and cache writes are dropped, instead of failing the request
+    '''
+    @functools.wraps(endpoint)
+    def decorated(*args, **kwargs):
+        with tolerate_bypass():
+            return endpoint(*args, **kwargs)
+    return decorated
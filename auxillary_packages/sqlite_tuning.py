@@ -0,0 +1,36 @@
+from sqlalchemy import event, Engine
+from typing import Any
+
+def production_pragmas(busy_timeout : int = 5000, mmap_size : int = 256*1024*1024, cache_size : int = -64000) -> dict[str, Any]:
+    '''Pragmas for serving concurrent readers and writers from a single SQLite file
+
+    params:
+
+    busy_timeout (int): Milliseconds a connection waits on a lock before failing with "database is locked"\n
+    mmap_size (int): Bytes of the database file to memory-map, letting reads skip a copy through the page cache\n
+    cache_size (int): Page cache size per connection, in pages if positive and in KiB if negative'''
+    return {"journal_mode" : "WAL",         # Readers see the last committed snapshot instead of waiting on writers
+            "synchronous" : "NORMAL",       # With WAL, only checkpoints fsync. Commits stay atomic and durable across application crashes
+            "busy_timeout" : busy_timeout,
+            "mmap_size" : mmap_size,
+            "cache_size" : cache_size,
+            "temp_store" : "MEMORY"}
+
+def read_only_pragmas(pragmas : dict[str, Any]) -> dict[str, Any]:
+    '''Pragmas for read-only connections to a database tuned with the given pragmas. The journal mode is left to the writers'''
+    return {**{pragma : value for pragma, value in pragmas.items() if pragma != "journal_mode"}, "query_only" : "ON"}
+
+def apply_pragmas(engine : Engine, pragmas : dict[str, Any]) -> None:
+    '''Run the given pragmas on every new DBAPI connection of the engine'''
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in pragmas.items():
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+        finally:
+            cursor.close()
+
+def read_only_uri(path : str) -> str:
+    '''SQLAlchemy URI opening the given database file read-only, so that connections never take a write lock'''
+    return f"sqlite:///file:{path}?mode=ro&uri=true"
@@ -1,21 +1,74 @@
 from flask import Flask
-from flask_bcrypt import Bcrypt
+from flask.globals import app_ctx
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from auxillary_packages.RedisManager import REDIS_MANAGER
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+from auxillary_packages.sqlite_tuning import production_pragmas, read_only_pragmas, apply_pragmas, read_only_uri
+from auxillary_packages.RedisManager import REDIS_MANAGER, connection_options_from_env
+from auxillary_packages.NearCache import NearCache
+from auxillary_packages.CircuitBreaker import CircuitBreaker
+from auxillary_packages.TranslatorPool import TranslatorPool
+from auxillary_packages.PasswordHasher import PasswordHasher
+from auxillary_packages.json_provider import OrjsonProvider
+from googletrans import Translator
 import os
 from babel.config import flask_config
+from babel.uploads import Babel_Request
 
 app = Flask(__name__)
+app.request_class = Babel_Request
+app.json = OrjsonProvider(app)
 app.config.from_object(flask_config)
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
-bcrypt = Bcrypt(app)
+
+# Session for read-only endpoints. In production mode it is bound to a dedicated read-only engine,
+# which under WAL reads the last committed snapshot and so never waits on (or blocks) writers
+if app.config["STORAGE_MODE"] == "production":
+    pragmas : dict = production_pragmas(busy_timeout=app.config["SQLITE_BUSY_TIMEOUT"],
+                                        mmap_size=app.config["SQLITE_MMAP_SIZE"],
+                                        cache_size=app.config["SQLITE_CACHE_SIZE"])
+    with app.app_context():
+        apply_pragmas(db.engine, pragmas)
+        # WAL is persisted in the database file, and must be in place before read-only connections can open it
+        db.engine.connect().close()
+
+    read_engine = create_engine(read_only_uri(app.config["DATABASE_PATH"]),
+                                pool_size=app.config["SQLITE_READ_POOL_SIZE"],
+                                max_overflow=0)
+    apply_pragmas(read_engine, read_only_pragmas(pragmas))
+    read_session = scoped_session(sessionmaker(bind=read_engine), scopefunc=lambda : id(app_ctx._get_current_object()))
+
+    @app.teardown_appcontext
+    def remove_read_session(exception = None):
+        read_session.remove()
+else:
+    read_session = db.session
+PASSWORD_HASHER = PasswordHasher(rounds=app.config["BCRYPT_LOG_ROUNDS"],
+                                 workers=app.config["PASSWORD_HASH_WORKERS"],
+                                 max_pending=app.config["PASSWORD_HASH_MAX_PENDING"],
+                                 timeout=app.config["PASSWORD_HASH_TIMEOUT"],
+                                 retry_after=app.config["PASSWORD_HASH_RETRY_AFTER"])
+PASSWORD_HASHER.start()
 
 RedisManager = REDIS_MANAGER(os.environ["REDIS_HOST"],
                             os.environ["REDIS_PORT"],
-                            os.environ["REDIS_DB"])
+                            os.environ["REDIS_DB"],
+                            circuit_breaker=CircuitBreaker(failure_threshold=app.config["REDIS_BREAKER_FAILURE_THRESHOLD"],
+                                                           cooldown=app.config["REDIS_BREAKER_COOLDOWN"]) if app.config["REDIS_BREAKER_FAILURE_THRESHOLD"] else None,
+                            **connection_options_from_env())
+if app.config["NEAR_CACHE_SIZE"]:
+    RedisManager.enable_near_cache(NearCache(max_entries=app.config["NEAR_CACHE_SIZE"], ttl=app.config["NEAR_CACHE_TTL"]),
+                                   prefixes=app.config["NEAR_CACHE_PREFIXES"])
+
+TRANSLATOR_POOL = TranslatorPool(factory=Translator,
+                                 size=app.config["TRANSLATOR_POOL_SIZE"],
+                                 borrow_timeout=app.config["TRANSLATOR_BORROW_TIMEOUT"],
+                                 max_idle=app.config["TRANSLATOR_MAX_IDLE"],
+                                 probe_after=app.config["TRANSLATOR_PROBE_AFTER"],
+                                 probe_timeout=app.config["TRANSLATOR_PROBE_TIMEOUT"])
 
 from babel import routes, views
 from babel import models
\ No newline at end of file
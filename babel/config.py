@@ -19,17 +19,70 @@ class Flask_Config:
         VALID_PROXIES : list = os.environ["VALID_PROXIES"].split(",")
         PRIVATE_IP_ADDRS : list = os.environ["PRIVATE_COMM_IP"].split(",")
 
+        # Password hashing metadata
+        BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+        PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+        PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 4 * PASSWORD_HASH_WORKERS))
+        PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+        PASSWORD_HASH_RETRY_AFTER = int(os.environ.get("PASSWORD_HASH_RETRY_AFTER", 1))
+
         # DB metadata
-        SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(CWD, os.environ["RS_DATABASE_URI"])
+        DATABASE_PATH = os.path.join(CWD, os.environ["RS_DATABASE_URI"])
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + DATABASE_PATH
         TRACK_MODIFICATIONS = bool(os.environ.get("TRACK_MODIFICATIONS", False))
 
+        # In production mode, SQLite runs in WAL mode with tuned pragmas and read-only endpoints use a separate read-only engine
+        STORAGE_MODE = os.environ.get("STORAGE_MODE", "development")
+        SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))
+        SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256*1024*1024))
+        SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", -64000))
+        SQLITE_READ_POOL_SIZE = int(os.environ.get("SQLITE_READ_POOL_SIZE", 8))
+        if STORAGE_MODE not in ("development", "production"):
+            raise ValueError(f"STORAGE_MODE MUST BE EITHER development OR production, NOT {STORAGE_MODE}")
+
         # Addressing metadata
         PORT = os.environ["PORT"]
         HOST = os.environ["HOST"]
 
         # File I/O metadata
-        UPLOAD_FOLDER = os.environ["UPLOAD_FOLDER"]
         MAX_CONTENT_LENGTH = int(os.environ["MAX_CONTENT_LENGTH"])
+        MAX_AUDIO_SIZE = int(os.environ.get("MAX_AUDIO_SIZE", 25*1024*1024))
+        AUDIO_SPOOL_SIZE = int(os.environ.get("AUDIO_SPOOL_SIZE", 1024*1024))
+        AUDIO_ASSUMED_BITRATE = int(os.environ.get("AUDIO_ASSUMED_BITRATE", 128000))
+
+        # Transcription job metadata
+        TRANSCRIPTION_WORKERS = int(os.environ.get("TRANSCRIPTION_WORKERS", 4))
+        TRANSCRIPTION_JOB_TTL = int(os.environ.get("TRANSCRIPTION_JOB_TTL", 3600))
+        TRANSCRIPT_CACHE_TTL = int(os.environ.get("TRANSCRIPT_CACHE_TTL", 7*24*3600))
+
+        # Near cache metadata, a size of 0 disables the in-process cache in front of Redis
+        NEAR_CACHE_SIZE = int(os.environ.get("NEAR_CACHE_SIZE", 1024))
+        NEAR_CACHE_TTL = float(os.environ.get("NEAR_CACHE_TTL", 30))
+        NEAR_CACHE_PREFIXES : list = os.environ.get("NEAR_CACHE_PREFIXES", "user:,usr:,TLS:").split(",")
+
+        # Redis circuit breaker metadata, a failure threshold of 0 disables the breaker
+        REDIS_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("REDIS_BREAKER_FAILURE_THRESHOLD", 5))
+        REDIS_BREAKER_COOLDOWN = float(os.environ.get("REDIS_BREAKER_COOLDOWN", 10))
+
+        # Translation metadata
+        TRANSLATOR_POOL_SIZE = int(os.environ.get("TRANSLATOR_POOL_SIZE", 8))
+        TRANSLATOR_BORROW_TIMEOUT = float(os.environ.get("TRANSLATOR_BORROW_TIMEOUT", 5))
+        TRANSLATOR_MAX_IDLE = float(os.environ.get("TRANSLATOR_MAX_IDLE", 300))
+        TRANSLATOR_PROBE_AFTER = float(os.environ.get("TRANSLATOR_PROBE_AFTER", 30))
+        TRANSLATOR_PROBE_TIMEOUT = float(os.environ.get("TRANSLATOR_PROBE_TIMEOUT", 2))
+        TRANSLATION_CACHE_TTL = int(os.environ.get("TRANSLATION_CACHE_TTL", 7*24*3600))
+        TRANSLATION_LOCK_TTL = int(os.environ.get("TRANSLATION_LOCK_TTL", 10))
+        TRANSLATION_WAIT_TIMEOUT = float(os.environ.get("TRANSLATION_WAIT_TIMEOUT", 5))
+        TRANSLATION_BATCH_LIMIT = int(os.environ.get("TRANSLATION_BATCH_LIMIT", 100))
+
+        # History metadata
+        TIMELINE_DEPTH = int(os.environ.get("TIMELINE_DEPTH", 500))
+        TIMELINE_TTL = int(os.environ.get("TIMELINE_TTL", 7*24*3600))
+        HISTORY_EXPORT_BATCH_SIZE = int(os.environ.get("HISTORY_EXPORT_BATCH_SIZE", 1000))
+
+        # Usage counters metadata
+        USAGE_FLUSH_INTERVAL = float(os.environ.get("USAGE_FLUSH_INTERVAL", 10))
+        USAGE_FLUSH_LOCK_TTL = int(os.environ.get("USAGE_FLUSH_LOCK_TTL", 60))
 
         # Logging metadata
         ERROR_LOG_FILE = os.path.join(CWD, os.environ["ERROR_LOG_FILE"])
@@ -49,11 +102,26 @@ class AssemblyAI_Config:
     TRANSCRIPT_URL = 'https://api.assemblyai.com/v2/transcript'
     AAI_API_KEY = os.environ.get("ASSEMBLY_AI_API_KEY", None)
 
+    # Polling metadata
+    POLL_MIN_INTERVAL = float(os.environ.get("ASSEMBLY_AI_POLL_MIN_INTERVAL", 1))
+    POLL_MAX_INTERVAL = float(os.environ.get("ASSEMBLY_AI_POLL_MAX_INTERVAL", 15))
+    POLL_TIMEOUT = float(os.environ.get("ASSEMBLY_AI_POLL_TIMEOUT", 600))
+
+    # Webhook metadata, polling only acts as a fallback when a webhook URL is set
+    WEBHOOK_URL = os.environ.get("ASSEMBLY_AI_WEBHOOK_URL", None)
+    WEBHOOK_AUTH_HEADER = "X-BABEL-WEBHOOK-SECRET"
+    WEBHOOK_SECRET = os.environ.get("ASSEMBLY_AI_WEBHOOK_SECRET", None)
+    WEBHOOK_FALLBACK_INTERVAL = float(os.environ.get("ASSEMBLY_AI_WEBHOOK_FALLBACK_INTERVAL", 30))
+    WEBHOOK_CHANNEL = "aai:webhook"
+
     if AAI_API_KEY is None:
         raise Missing_Configuration_Error(f"ASSEMBLY-AI API KEY NOT FOUND! SEE CLASS AssemblyAI_Config IN {__file__}")
     
     if not AAI_API_KEY.isalnum():
         raise ValueError(f"ASSEMBLY-AI API KEY IS INVALID. MUST BE STRINCTLY ALPHA-NUMERIC, NOT {AAI_API_KEY}")
+
+    if WEBHOOK_URL and not WEBHOOK_SECRET:
+        raise Missing_Configuration_Error(f"ASSEMBLY-AI WEBHOOK SECRET NOT FOUND, REQUIRED WHEN A WEBHOOK URL IS SET! SEE CLASS AssemblyAI_Config IN {__file__}")
    
 #Translation
 try:
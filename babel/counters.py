@@ -0,0 +1,137 @@
+from babel import app, db, RedisManager
+from babel.models import User
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.exc import SQLAlchemyError
+from typing import Literal, Optional
+import secrets
+import threading
+import traceback
+
+# Usage counters are incremented in Redis and written behind to the users table, so that recording a request never
+# takes SQLite's write lock on the users row. Pending deltas live in a single hash of "{counter}:{user ID}" fields.
+# The flusher atomically renames that hash aside before applying it, and only deletes it once the database commit succeeds.
+# A flusher dying in between leaves the renamed hash behind to be re-applied, so deltas are applied at least once.
+# Deltas recorded before users were identified by ID are keyed "{username}:{counter}" instead, which always ends in a counter name
+# (and the current format never does), so fields are told apart without guessing whether a username that looks like an ID is one
+
+Counter = Literal["translations", "transcriptions"]
+COUNTERS : tuple[Counter, ...] = ("translations", "transcriptions")
+
+PENDING_KEY = "uc:pending"
+FLUSHING_KEY = "uc:flushing"
+FLUSH_LOCK_KEY = "uc:flush-lock"
+
+def record_usage(uid : int, counter : Counter, amount : int = 1) -> None:
+    if RedisManager.hincrby(PENDING_KEY, f"{counter}:{uid}", amount) is not None:
+        return
+    # Redis is being bypassed, so the delta is written through rather than lost
+    users = User.__table__
+    try:
+        db.session.execute(update(users).where(users.c.id == uid).values({counter : users.c[counter] + amount}))
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        print(f"[Usage Counters] Failed to record {amount} {counter} for user {uid}")
+
+def pending_usage(uid : int) -> dict[Counter, int]:
+    '''Deltas recorded against a user that have not yet been written to the database'''
+    fields : list[str] = [f"{counter}:{uid}" for counter in COUNTERS]
+    pending : dict[Counter, int] = dict.fromkeys(COUNTERS, 0)
+    with RedisManager.pipeline() as pipeline:
+        for key in (PENDING_KEY, FLUSHING_KEY):
+            pipeline.hmget(key, fields)
+    for deltas in pipeline.results or ():
+        for counter, delta in zip(COUNTERS, deltas):
+            pending[counter] += int(delta or 0)
+    return pending
+
+def merge_pending_usage(uid : int, record : dict, pending : Optional[dict[Counter, int]] = None) -> dict:
+    '''Add a user's pending deltas (looked up unless given) to the counters of their (possibly cached) database record'''
+    for counter, delta in (pending or pending_usage(uid)).items():
+        record[counter] += delta
+    return record
+
+def flush_usage() -> int:
+    '''Apply pending deltas to the users table, returns the number of users updated'''
+    # Every process runs a flusher, only one of them may hold the renamed hash at a time
+    token : str = secrets.token_hex(16)
+    if not RedisManager.set(FLUSH_LOCK_KEY, token, ex=app.config["USAGE_FLUSH_LOCK_TTL"], nx=True):
+        return 0
+    try:
+        if not RedisManager.exists(FLUSHING_KEY):
+            if not RedisManager.exists(PENDING_KEY):
+                return 0
+            RedisManager.rename(PENDING_KEY, FLUSHING_KEY)
+
+        fields : list[tuple[Counter, int, int]] = []
+        legacy_fields : list[tuple[str, Counter, int]] = []
+        for field, delta in RedisManager.hgetall(FLUSHING_KEY).items():
+            head, tail = field.decode().rsplit(":", 1)
+            if tail in COUNTERS:
+                legacy_fields.append((head, tail, int(delta)))
+            else:
+                fields.append((head, int(tail), int(delta)))
+
+        deltas : dict[int, dict[Counter, int]] = {}
+        usernames : list[str] = []
+        if fields or legacy_fields:
+            users = User.__table__
+            try:
+                for counter, uid, delta in fields:
+                    deltas.setdefault(uid, dict.fromkeys(COUNTERS, 0))[counter] += delta
+                if legacy_fields:
+                    # Always resolved by username, including usernames that look like IDs. Deltas of users that no longer resolve are dropped
+                    legacy : set[str] = {user for user, _, _ in legacy_fields}
+                    uids : dict[str, int] = dict(db.session.execute(select(User.username, User.id).where(User.username.in_(legacy))).all())
+                    for user, counter, delta in legacy_fields:
+                        if user in uids:
+                            deltas.setdefault(uids[user], dict.fromkeys(COUNTERS, 0))[counter] += delta
+
+                if deltas:
+                    db.session.execute(update(users)
+                                       .where(users.c.id == bindparam("uid"), users.c.deleted == False)
+                                       .values(translations=users.c.translations + bindparam("translations_delta"),
+                                               transcriptions=users.c.transcriptions + bindparam("transcriptions_delta")),
+                                       [{"uid" : uid, "translations_delta" : counts["translations"], "transcriptions_delta" : counts["transcriptions"]}
+                                        for uid, counts in deltas.items()])
+                    usernames = db.session.execute(select(User.username).where(User.id.in_(deltas))).scalars().all()
+                    db.session.commit()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                raise e
+
+            # Cached user records hold the counters from before this flush, and would otherwise miss the flushed deltas
+            RedisManager.delete(*(key for username in usernames for key in (f"user:{username}", f"usr:{username}")))
+
+        RedisManager.delete(FLUSHING_KEY)
+        return len(deltas)
+    finally:
+        # A flush outliving the lock's TTL must not release the lock of the flusher that took over
+        RedisManager.delete_if_equals(FLUSH_LOCK_KEY, token)
+
+class UsageFlusher:
+    '''Daemon thread periodically writing pending usage counters to the database'''
+
+    def __init__(self, interval : float) -> None:
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="usage-flusher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with app.app_context():
+                try:
+                    flush_usage()
+                except Exception:
+                    # Deltas stay in Redis and are retried on the next run
+                    print("[Usage Flusher] Failed to flush usage counters")
+                    print(traceback.format_exc())
+
+USAGE_FLUSHER = UsageFlusher(interval=app.config["USAGE_FLUSH_INTERVAL"])
+USAGE_FLUSHER.start()
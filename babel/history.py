@@ -0,0 +1,115 @@
+from babel import db, read_session
+from babel.models import Transcription_Request, Translation_Request
+from werkzeug.exceptions import BadRequest
+from sqlalchemy import select
+from sqlalchemy.sql import literal, tuple_, Select
+from datetime import datetime
+from typing import Optional, Literal, Iterator
+import heapq
+import base64
+import orjson
+import zlib
+
+HistoryKind = Literal["translation", "transcription"]
+
+# Filter preferences accepted by GET /fetch-history
+FILTERS : dict[int, Optional[HistoryKind]] = {0 : None, 1 : "translation", 2 : "transcription"}
+
+def transcription_entry(id : int, time_requested : datetime, text : str, language : str) -> dict:
+    return {"id" : id, "time_requested" : time_requested, "content" : text, "lang" : language, "type" : "transcription", "src" : None, "dst" : None}
+
+def translation_entry(id : int, time_requested : datetime, text : str, src : str, dst : str) -> dict:
+    return {"id" : id, "time_requested" : time_requested, "content" : text, "lang" : None, "type" : "translation", "src" : src, "dst" : dst}
+
+def encode_history_cursor(time_requested : datetime | str, entry_type : str, entry_id : int) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([time_requested, entry_type, entry_id])).decode()
+
+def decode_history_cursor(cursor : str) -> tuple[datetime, str, int]:
+    try:
+        time_requested, entry_type, entry_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(time_requested), str(entry_type), int(entry_id)
+    except (ValueError, TypeError, orjson.JSONDecodeError):
+        raise BadRequest("Invalid history cursor")
+
+def is_past_cursor(entry_type : str, entry_id : int, cursor_type : str, cursor_id : int, descending : bool) -> bool:
+    '''For entries sharing the cursor's timestamp, whether the entry comes after the cursor in (time_requested, type, id) order'''
+    return (entry_type, entry_id) < (cursor_type, cursor_id) if descending else (entry_type, entry_id) > (cursor_type, cursor_id)
+
+def history_branch(model : type[db.Model], entry_type : HistoryKind, columns : tuple, uid : int, cursor : Optional[tuple], descending : bool, limit : Optional[int]) -> Select:
+    '''Keyset-paginated query over one history table, ordered by (time_requested, type, id) to match the combined history'''
+    query = select(*columns).where(model.requested_by == uid)
+    if cursor:
+        cursor_time, cursor_type, cursor_id = cursor
+        # Rows of this table come after the cursor's row if they are strictly past it in (time_requested, type, id) order
+        if entry_type == cursor_type:
+            query = query.where(tuple_(model.time_requested, model.id) < (cursor_time, cursor_id) if descending
+                                else tuple_(model.time_requested, model.id) > (cursor_time, cursor_id))
+        elif (entry_type < cursor_type) == descending:
+            query = query.where(model.time_requested <= cursor_time if descending else model.time_requested >= cursor_time)
+        else:
+            query = query.where(model.time_requested < cursor_time if descending else model.time_requested > cursor_time)
+
+    return (query.order_by(model.time_requested.desc() if descending else model.time_requested.asc(),
+                           model.id.desc() if descending else model.id.asc())
+            .limit(limit))
+
+def history_query(uid : int, kind : Optional[HistoryKind], cursor : Optional[tuple], descending : bool, limit : Optional[int]) -> Select:
+    '''Query for a user's history past the cursor, of one kind or both when kind is None. A limit of None fetches the entire history'''
+    transcriptionQuery = history_branch(Transcription_Request, "transcription",
+                                        (Transcription_Request.id,
+                                         Transcription_Request.time_requested.label("time_requested"),
+                                         Transcription_Request.transcripted_text.label("content"),
+                                         Transcription_Request.language.label("lang"),
+                                         literal("transcription").label("type"),
+                                         literal(None).label("src"),
+                                         literal(None).label("dst")),
+                                        uid, cursor, descending, limit)
+    if kind == "transcription":
+        return transcriptionQuery
+
+    translationQuery = history_branch(Translation_Request, "translation",
+                                      (Translation_Request.id,
+                                       Translation_Request.time_requested.label("time_requested"),
+                                       Translation_Request.translated_text.label("content"),
+                                       literal(None).label("lang"),
+                                       literal("translation").label("type"),
+                                       Translation_Request.language_from.label("src"),
+                                       Translation_Request.language_to.label("dst")),
+                                      uid, cursor, descending, limit)
+    if kind == "translation":
+        return translationQuery
+
+    # Each branch is limited before the union, so both only scan their own index range
+    transcriptions = transcriptionQuery.subquery()
+    translations = translationQuery.subquery()
+    return (select(transcriptions).union_all(select(translations))
+            .order_by(*(db.desc(column) if descending else db.asc(column) for column in ("time_requested", "type", "id")))
+            .limit(limit))
+
+def export_history(uid : int, kind : Optional[HistoryKind], batch_size : int) -> Iterator[bytes]:
+    '''Yield a user's entire history in ascending (time_requested, type, id) order as NDJSON, batch_size rows at a time.
+
+    Each table is read through its own server-side cursor in index order and the two are merged here,
+    so that neither SQLite nor this process ever holds more than a couple of batches of rows'''
+    streams : list[Iterator] = []
+    for entry_type in ("transcription", "translation"):
+        if kind in (None, entry_type):
+            streams.append(read_session.execute(history_query(uid, entry_type, None, False, None)
+                                              .execution_options(yield_per=batch_size)))
+
+    batch : list[bytes] = []
+    for row in heapq.merge(*streams, key=lambda row : (row.time_requested, row.type, row.id)):
+        batch.append(orjson.dumps(row._asdict(), option=orjson.OPT_APPEND_NEWLINE))
+        if len(batch) == batch_size:
+            yield b"".join(batch)
+            batch.clear()
+    if batch:
+        yield b"".join(batch)
+
+def gzip_chunks(chunks : Iterator[bytes], level : int = 6) -> Iterator[bytes]:
+    '''Compress a stream of chunks into a single gzip member, flushing after every chunk so that the client receives data as it is produced'''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH):
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,177 @@
+from babel import app, db, RedisManager
+from babel.models import Transcription_Request
+from babel.history import transcription_entry
+from babel import timeline
+from babel.counters import record_usage
+from babel.transciber import getAudioTranscription, upload_audio, build_headers
+from babel.uploads import estimate_duration
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.exceptions import ServiceUnavailable
+from datetime import datetime
+from typing import Optional, IO
+import orjson
+import time
+import uuid
+import traceback
+
+# Single process-wide executor, so that request workers are never parked on AssemblyAI's latency
+TRANSCRIPTION_EXECUTOR = ThreadPoolExecutor(max_workers=app.config["TRANSCRIPTION_WORKERS"],
+                                            thread_name_prefix="transcription-job")
+
+def job_key(job_id : str) -> str:
+    return f"TJ:{job_id}"
+
+# Transcripts are content-addressed by the SHA-256 digest of the audio
+def transcript_cache_key(digest : str) -> str:
+    return f"TC:{digest}"
+
+def inflight_key(digest : str) -> str:
+    return f"TCP:{digest}"
+
+def waiters_key(digest : str) -> str:
+    return f"TCW:{digest}"
+
+def fetch_job(job_id : str) -> Optional[dict]:
+    '''Fetch the current state of a transcription job, None if the job does not exist or has expired'''
+    record = RedisManager.get(job_key(job_id))
+    if not record:
+        return None
+    return orjson.loads(record)
+
+def fetch_cached_transcript(digest : str) -> Optional[dict]:
+    '''Fetch a completed transcript for the given audio digest, refreshing its expiry so that frequently uploaded audio stays cached'''
+    cached = RedisManager.get(transcript_cache_key(digest))
+    if not cached:
+        return None
+    RedisManager.expire(transcript_cache_key(digest), app.config["TRANSCRIPT_CACHE_TTL"])
+    return orjson.loads(cached)
+
+def _set_job_state(job_id : str, state : dict) -> None:
+    RedisManager.setex(job_key(job_id), app.config["TRANSCRIPTION_JOB_TTL"], orjson.dumps(state))
+
+def submit_transcription_job(audio_stream : IO[bytes], digest : str, requested_by : int) -> dict:
+    ''' ### Transcribe an uploaded audio file, reusing cached or in-flight transcripts of identical audio
+
+    params:
+
+    audio_stream: Readable binary stream of the audio file
+    digest: SHA-256 hex digest of the audio file
+    requested_by: ID of the user that requested this transcription
+
+    returns: State of the job, to be polled via GET /transcription-jobs/<id> unless already completed
+    '''
+    job_id : str = uuid.uuid4().hex
+    state : dict = {"id" : job_id,
+                    "status" : "queued",
+                    "owner" : requested_by,
+                    "time_queued" : time.time()}
+
+    # A job is only ever started while holding the in-flight marker, retrying until either that or attaching to the holder succeeds
+    while True:
+        cached = fetch_cached_transcript(digest)
+        if cached:
+            _complete_job(state, cached)
+            return state
+
+        acquired : Optional[bool] = RedisManager.set(inflight_key(digest), job_id, ex=app.config["TRANSCRIPTION_JOB_TTL"], nx=True)
+        if acquired is None:
+            # Redis is being bypassed, jobs can neither be deduplicated nor polled
+            raise ServiceUnavailable("Transcription service unavailable, please retry shortly")
+        if acquired:
+            _start_job(state, audio_stream, digest)
+            return state
+
+        # Identical audio is already being transcribed, attach to that job instead of starting another one
+        _set_job_state(job_id, state)
+        with RedisManager.pipeline() as pipeline:
+            pipeline.rpush(waiters_key(digest), job_id)
+            pipeline.expire(waiters_key(digest), app.config["TRANSCRIPTION_JOB_TTL"])
+            pipeline.exists(inflight_key(digest))
+        if pipeline.results and pipeline.results[-1]:
+            return state
+
+        # The in-flight job settled in the meantime. Whoever removes this job from the waiters settles it
+        if not RedisManager.lrem(waiters_key(digest), 1, job_id):
+            return state
+
+def _start_job(state : dict, audio_stream : IO[bytes], digest : str) -> None:
+    try:
+        audio_url : str = upload_audio(build_headers(), audio_stream)
+    except Exception as e:
+        _release_waiters(digest, state["id"], error="Failed to upload audio for transcription")
+        raise e
+
+    # AssemblyAI only reports the audio's duration once the transcript completes, so polling is paced by an estimate instead
+    audio_duration : Optional[float] = estimate_duration(audio_stream, app.config["AUDIO_ASSUMED_BITRATE"])
+    _set_job_state(state["id"], state)
+    TRANSCRIPTION_EXECUTOR.submit(_run_transcription_job, audio_url, digest, state, audio_duration)
+
+def _run_transcription_job(audio_url : str, digest : str, state : dict, audio_duration : Optional[float] = None) -> None:
+    with app.app_context():
+        result : Optional[dict] = None
+        try:
+            state["status"] = "processing"
+            _set_job_state(state["id"], state)
+            result = getAudioTranscription(audio_url, audio_duration=audio_duration)
+            RedisManager.setex(transcript_cache_key(digest), app.config["TRANSCRIPT_CACHE_TTL"], orjson.dumps(result))
+            _complete_job(state, result)
+            _release_waiters(digest, state["id"], result=result)
+        except Exception as e:
+            # Includes Redis failing (or its circuit being open) after the transcript came back, which would otherwise
+            # leave this job processing, its waiters unsettled and the in-flight marker held until it expires
+            print(f"[Transcription Job {state['id']}] Failed to transcribe audio")
+            print(traceback.format_exc())
+            try:
+                if state["status"] == "completed":
+                    # Only settling the waiters failed, they are given the transcript this job already recorded
+                    _release_waiters(digest, state["id"], result=result)
+                else:
+                    state.update({"status" : "failed", "error" : getattr(e, "description", "Transcription failed")})
+                    _set_job_state(state["id"], state)
+                    _release_waiters(digest, state["id"], error=state["error"])
+            except Exception:
+                print(f"[Transcription Job {state['id']}] Failed to settle job, its state expires after TRANSCRIPTION_JOB_TTL")
+                print(traceback.format_exc())
+
+def _release_waiters(digest : str, job_id : str, result : Optional[dict] = None, error : Optional[str] = None) -> None:
+    '''Settle every job attached to the in-flight transcription of the given audio'''
+    # The marker may have expired and been taken by another job since, which must keep it
+    RedisManager.delete_if_equals(inflight_key(digest), job_id)
+    while waiterID := RedisManager.lpop(waiters_key(digest)):
+        waiter = fetch_job(waiterID)
+        if not waiter:
+            continue
+        if result:
+            _complete_job(waiter, result)
+        else:
+            waiter.update({"status" : "failed", "error" : error})
+            _set_job_state(waiterID, waiter)
+
+def _complete_job(state : dict, result : dict) -> None:
+    '''Record the transcript against the job's owner, and mark the job as completed'''
+    try:
+        time_requested : datetime = datetime.fromtimestamp(state["time_queued"])
+        transcriptionID = db.session.execute(insert(Transcription_Request)
+                                             .values(requested_by=state["owner"],
+                                                     language="en",
+                                                     transcripted_text=result["text"],
+                                                     time_requested=time_requested)
+                                             .returning(Transcription_Request.id)).scalar_one()
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        print(traceback.format_exc())
+        state.update({"status" : "failed", "error" : "Failed to record transcription"})
+        _set_job_state(state["id"], state)
+        return
+
+    record_usage(state["owner"], "transcriptions")
+    timeline.append(state["owner"], [transcription_entry(transcriptionID, time_requested, result["text"], "en")])
+    state.update({"status" : "completed",
+                  "transcription_id" : transcriptionID,
+                  "text" : result["text"],
+                  "confidence" : result["confidence"],
+                  "time" : time.time() - state["time_queued"]})
+    _set_job_state(state["id"], state)
@@ -0,0 +1,33 @@
+"""composite history indexes for keyset pagination
+
+Revision ID: c41a7e9d2b58
+Revises: 5b70af3afed8
+Create Date: 2026-10-18 10:12:41.208317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41a7e9d2b58'
+down_revision = '5b70af3afed8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Serves GET /fetch-history: equality on requested_by, then a range scan in (time_requested, id) order
+    with op.batch_alter_table('translations', schema=None) as batch_op:
+        batch_op.create_index('ix_translations_requested_by_time_requested_id', ['requested_by', 'time_requested', 'id'], unique=False)
+
+    with op.batch_alter_table('transcriptions', schema=None) as batch_op:
+        batch_op.create_index('ix_transcriptions_requested_by_time_requested_id', ['requested_by', 'time_requested', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transcriptions', schema=None) as batch_op:
+        batch_op.drop_index('ix_transcriptions_requested_by_time_requested_id')
+
+    with op.batch_alter_table('translations', schema=None) as batch_op:
+        batch_op.drop_index('ix_translations_requested_by_time_requested_id')
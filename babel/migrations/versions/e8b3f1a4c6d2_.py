@@ -0,0 +1,84 @@
+"""history requested_by holds user IDs instead of usernames
+
+Revision ID: e8b3f1a4c6d2
+Revises: c41a7e9d2b58
+Create Date: 2026-10-18 14:03:27.551904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b3f1a4c6d2'
+down_revision = 'c41a7e9d2b58'
+branch_labels = None
+depends_on = None
+
+HISTORY_TABLES = ('translations', 'transcriptions')
+BATCH_SIZE = 5000
+# Untyped scratch column holding the resolved value of requested_by, so that an interrupted run picks up where it left off
+RESOLVED_COLUMN = 'resolved_requested_by'
+
+def _in_batches(table, statement):
+    # Walks the table in primary key ranges, committing every batch so that SQLite's write lock is only ever held briefly
+    connection = op.get_bind()
+    last_id = connection.execute(sa.text(f"SELECT MAX(id) FROM {table}")).scalar() or 0
+    for start in range(0, last_id, BATCH_SIZE):
+        connection.execute(sa.text(f"{statement} AND id > :start AND id <= :stop"), {"start" : start, "stop" : start + BATCH_SIZE})
+
+def _rewrite_requested_by(table, lookup, aside):
+    '''Replace requested_by with the result of lookup, moving rows it resolves nothing for into the aside table'''
+    connection = op.get_bind()
+    # Created before the scratch column is added, so that it only ever has the history table's own columns
+    op.execute(f"CREATE TABLE IF NOT EXISTS {aside} AS SELECT * FROM {table} WHERE 0")
+    columns = ", ".join(column["name"] for column in sa.inspect(connection).get_columns(aside))
+    if RESOLVED_COLUMN not in {column["name"] for column in sa.inspect(connection).get_columns(table)}:
+        op.execute(f"ALTER TABLE {table} ADD COLUMN {RESOLVED_COLUMN}")
+
+    _in_batches(table, f"UPDATE {table} SET {RESOLVED_COLUMN} = ({lookup}) WHERE {RESOLVED_COLUMN} IS NULL")
+    # Nothing is dropped, rows of users that no longer resolve (e.g. deleted, or renamed in a restored database) are kept aside
+    op.execute(f"INSERT INTO {aside} ({columns}) SELECT {columns} FROM {table} WHERE {RESOLVED_COLUMN} IS NULL AND id NOT IN (SELECT id FROM {aside})")
+    op.execute(f"DELETE FROM {table} WHERE {RESOLVED_COLUMN} IS NULL")
+    _in_batches(table, f"UPDATE {table} SET requested_by = {RESOLVED_COLUMN} WHERE requested_by IS NOT {RESOLVED_COLUMN}")
+    op.execute(f"ALTER TABLE {table} DROP COLUMN {RESOLVED_COLUMN}")
+
+def _restore_aside(table, aside):
+    '''Put back rows kept aside by the opposite direction, which still hold requested_by as it was before it ran'''
+    connection = op.get_bind()
+    if not sa.inspect(connection).has_table(aside):
+        return
+    columns = ", ".join(column["name"] for column in sa.inspect(connection).get_columns(aside))
+    op.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {aside} WHERE id NOT IN (SELECT id FROM {table})")
+    op.execute(f"DROP TABLE {aside}")
+
+def upgrade():
+    # requested_by was declared as an integer FK but written with usernames. Through SQLite's type affinity, usernames that look like
+    # numbers were stored as numbers ('007' as 7, '1e3' as 1000), so the column's storage class says nothing about whether it holds a username or an ID.
+    # Text values are matched by their text form. Numeric ones are matched by comparing usernames against the column itself, which applies
+    # the same affinity conversion to them, and only resolve if exactly one username converts to that number ('7' and '007' both do)
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        for table in HISTORY_TABLES:
+            matches = f"FROM users WHERE users.username = {table}.requested_by"
+            # Rows an interrupted run already rewrote hold IDs, and are left out
+            unresolved = f" AND {RESOLVED_COLUMN} IS NULL" if RESOLVED_COLUMN in {column["name"] for column in sa.inspect(connection).get_columns(table)} else ""
+            ambiguous = connection.execute(sa.text(f"SELECT COUNT(*) FROM {table} WHERE typeof(requested_by) IN ('integer', 'real') "
+                                                   f"AND (SELECT COUNT(*) {matches}) > 1{unresolved}")).scalar()
+            if ambiguous:
+                print(f"{ambiguous} rows of {table} match more than one username, and are kept in {table}_unresolved_usernames")
+            _rewrite_requested_by(table, f"CASE WHEN typeof({table}.requested_by) IN ('integer', 'real') "
+                                         f"THEN (SELECT MIN(users.id) {matches} HAVING COUNT(*) = 1) "
+                                         f"ELSE (SELECT users.id FROM users WHERE users.username = CAST({table}.requested_by AS TEXT)) END",
+                                  f"{table}_unresolved_usernames")
+            _restore_aside(table, f"{table}_unresolved_ids")
+        op.execute("ANALYZE")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in HISTORY_TABLES:
+            _rewrite_requested_by(table, f"SELECT users.username FROM users WHERE users.id = {table}.requested_by",
+                                  f"{table}_unresolved_ids")
+            _restore_aside(table, f"{table}_unresolved_usernames")
+        op.execute("ANALYZE")
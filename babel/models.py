@@ -42,6 +42,7 @@ class User(db.Model):
     
 class Translation_Request(db.Model):
     __tablename__ = "translations"
+    __table_args__ = (db.Index("ix_translations_requested_by_time_requested_id", "requested_by", "time_requested", "id"),)
 
     #Main Metadata
     id = db.Column(db.Integer, primary_key = True, nullable = False)
@@ -74,6 +75,7 @@ class Translation_Request(db.Model):
 
 class Transcription_Request(db.Model):
     __tablename__ = "transcriptions"
+    __table_args__ = (db.Index("ix_transcriptions_requested_by_time_requested_id", "requested_by", "time_requested", "id"),)
 
     #Main Metadata
     id = db.Column(db.Integer, primary_key = True, nullable = False)
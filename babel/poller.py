@@ -0,0 +1,172 @@
+import threading
+import time
+import traceback
+from typing import Callable, Optional, Union
+
+from auxillary_packages.errors import API_TIMEOUT_ERROR
+
+class _PendingTranscript:
+    __slots__ = ("transcript_id", "headers", "event", "result", "error", "started", "next_check", "interval", "failures", "audio_duration")
+
+    def __init__(self, transcript_id : str, headers : dict, first_check : float, audio_duration : Optional[float] = None) -> None:
+        self.transcript_id = transcript_id
+        self.headers = headers
+        self.event = threading.Event()
+        self.result : Optional[dict] = None
+        self.error : Optional[str] = None
+        self.started = time.monotonic()
+        self.next_check = self.started + first_check
+        self.interval = first_check
+        self.failures = 0
+        self.audio_duration = audio_duration
+
+class TranscriptPoller:
+    '''### Single poller for every in-flight AssemblyAI transcript in this process
+
+    #### Usage
+    Callers register a transcript ID through wait(), which blocks until the transcript settles. A single daemon thread
+    checks every pending transcript when it is due, spacing checks out based on the audio duration. AssemblyAI leaves the duration null
+    until the transcript completes, so callers pass in an estimate made at submission, which is used until an actual duration is reported.
+    If AssemblyAI's webhooks are enabled, notify() marks a transcript as due immediately and polling only acts as a fallback.
+
+    Note: It is best if only a single instance of this class is active'''
+
+    def __init__(self, status_fetcher : Callable[[dict, str], Optional[dict]],
+                 min_interval : float = 1,
+                 max_interval : float = 15,
+                 backoff : float = 1.5,
+                 processing_ratio : float = 0.3,
+                 webhook_fallback_interval : Optional[float] = None,
+                 max_failures : int = 5):
+        '''Initialize the poller
+
+        params:
+
+        status_fetcher (callable): Function accepting headers and a transcript ID, returning AssemblyAI's transcript JSON (None on failure)\n
+        min_interval (float): Smallest gap between 2 checks of the same transcript\n
+        max_interval (float): Largest gap between 2 checks of the same transcript\n
+        backoff (float): Multiplier applied to the gap once the expected processing time has passed\n
+        processing_ratio (float): Expected processing time as a fraction of the audio duration\n
+        webhook_fallback_interval (float): Gap between checks when webhooks are expected to report completion, None if webhooks are disabled\n
+        max_failures (int): Consecutive failed checks after which a transcript is given up on'''
+        self._fetch_status = status_fetcher
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.processing_ratio = processing_ratio
+        self.webhook_fallback_interval = webhook_fallback_interval
+        self.max_failures = max_failures
+
+        self._pending : dict[str, _PendingTranscript] = {}
+        self._condition = threading.Condition()
+        self._thread : Optional[threading.Thread] = None
+
+    def wait(self, transcript_id : Union[str, int], headers : dict, timeout : float, audio_duration : Optional[float] = None) -> dict:
+        '''Block until the given transcript is completed, returning AssemblyAI's transcript JSON. audio_duration is an estimate in seconds, if known'''
+        transcript_id = str(transcript_id)
+        first_check = self.webhook_fallback_interval or self.min_interval
+        with self._condition:
+            pending = self._pending.setdefault(transcript_id, _PendingTranscript(transcript_id, headers, first_check, audio_duration))
+            self._ensure_running()
+            self._condition.notify()
+
+        if not pending.event.wait(timeout):
+            with self._condition:
+                self._pending.pop(transcript_id, None)
+            raise API_TIMEOUT_ERROR(endpoint=f"transcript/{transcript_id}")
+
+        if pending.error:
+            raise RuntimeError(f"Transcription Failed: {pending.error}")
+        return pending.result
+
+    def notify(self, transcript_id : Union[str, int]) -> bool:
+        '''Mark a transcript as due for an immediate check, returns False if it is not tracked by this process'''
+        with self._condition:
+            pending = self._pending.get(str(transcript_id))
+            if not pending:
+                return False
+            pending.next_check = time.monotonic()
+            self._condition.notify()
+        return True
+
+    def listen(self, pubsub_factory : Callable, channel : str) -> None:
+        '''Subscribe to a channel carrying transcript IDs reported by webhooks, so that a webhook received by any worker wakes up the one waiting on it'''
+        def _listen() -> None:
+            while True:
+                try:
+                    pubsub = pubsub_factory()
+                    pubsub.subscribe(channel)
+                    for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.notify(message["data"].decode("utf-8") if isinstance(message["data"], bytes) else message["data"])
+                except Exception:
+                    print(f"[Transcript Poller] Lost subscription to {channel}, retrying")
+                    time.sleep(self.max_interval)
+
+        threading.Thread(target=_listen, name="transcript-webhook-listener", daemon=True).start()
+
+    def _ensure_running(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="transcript-poller", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    due = [pending for pending in self._pending.values() if pending.next_check <= now]
+                    if due:
+                        break
+                    timeout = min((pending.next_check for pending in self._pending.values()), default=None)
+                    self._condition.wait(None if timeout is None else timeout - now)
+
+            for pending in due:
+                try:
+                    self._check(pending)
+                except Exception:
+                    print(f"[Transcript Poller] Unexpected error while checking transcript {pending.transcript_id}")
+                    print(traceback.format_exc())
+                    self._settle(pending, error="Unexpected error while checking transcript status")
+
+    def _check(self, pending : _PendingTranscript) -> None:
+        result = self._fetch_status(pending.headers, pending.transcript_id)
+        if result is None:
+            pending.failures += 1
+            if pending.failures >= self.max_failures:
+                self._settle(pending, error="AssemblyAI could not be reached")
+            else:
+                self._reschedule(pending, min(self.max_interval, pending.interval * self.backoff))
+            return
+
+        pending.failures = 0
+        if result["status"] == "completed":
+            self._settle(pending, result=result)
+        elif result["status"] == "error":
+            self._settle(pending, error=result.get("error", "Unknown error"))
+        else:
+            self._reschedule(pending, self._next_interval(pending, result.get("audio_duration") or pending.audio_duration))
+
+    def _next_interval(self, pending : _PendingTranscript, audio_duration : Optional[float]) -> float:
+        if self.webhook_fallback_interval:
+            return self.webhook_fallback_interval
+
+        # Wait out the expected processing time in one go, then back off for stragglers
+        if audio_duration:
+            remaining = pending.started + audio_duration * self.processing_ratio - time.monotonic()
+            if remaining > self.min_interval:
+                return min(self.max_interval, remaining)
+        return min(self.max_interval, max(self.min_interval, pending.interval * self.backoff))
+
+    def _reschedule(self, pending : _PendingTranscript, interval : float) -> None:
+        with self._condition:
+            pending.interval = interval
+            pending.next_check = time.monotonic() + interval
+
+    def _settle(self, pending : _PendingTranscript, result : Optional[dict] = None, error : Optional[str] = None) -> None:
+        with self._condition:
+            self._pending.pop(pending.transcript_id, None)
+        pending.result = result
+        pending.error = error
+        pending.event.set()
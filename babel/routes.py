@@ -1,24 +1,31 @@
-from flask import jsonify, request, abort, g
+from flask import jsonify, request, abort, g, stream_with_context
 import time
-from babel import app, db, bcrypt, RedisManager
+from babel import app, db, read_session, PASSWORD_HASHER, RedisManager
 from babel.models import *
 from babel.config import *
 from auxillary_packages.errors import *
-from werkzeug.exceptions import Unauthorized, InternalServerError, HTTPException, Forbidden, NotFound, MethodNotAllowed
-from babel.transciber import getAudioTranscription
-from googletrans import Translator
+from werkzeug.exceptions import Unauthorized, InternalServerError, HTTPException, Forbidden, NotFound, MethodNotAllowed, ServiceUnavailable
+from babel.jobs import submit_transcription_job, fetch_job
+from babel.transciber import TRANSCRIPT_POLLER
+from babel.history import FILTERS, history_query, export_history, gzip_chunks, encode_history_cursor, decode_history_cursor, translation_entry
+from babel import timeline
+from babel.counters import record_usage, pending_usage, merge_pending_usage
+from babel.translation import TRANSLATION_EXECUTOR, translation_cache_key, translate_single_flight, fetch_cached_payloads, fetch_cached_translations, cache_stats
 from sqlalchemy import select, insert, update, delete
-from sqlalchemy.sql import literal
-from sqlalchemy.exc import IntegrityError, DataError, StatementError, SQLAlchemyError, CompileError
+from sqlalchemy.exc import IntegrityError, DataError, StatementError, SQLAlchemyError
 from auxillary_packages.decorators import *
 import jwt
 import requests
 import orjson
-import zlib
 import traceback
+import secrets
+import hashlib
+import contextvars
+from typing import Optional
 
-# in-memory 
-LANG_CACHE = None
+# Available languages only change across deployments, so their response is serialized once at startup
+LANGUAGES_BODY : bytes = orjson.dumps({"auto" : "auto-detect", **AVAILABLE_LANGUAGES})
+LANGUAGES_ETAG : str = hashlib.sha256(LANGUAGES_BODY).hexdigest()
 
 @app.after_request
 def afterRequest(response):
@@ -53,6 +60,13 @@ def unexpected_request_format(e : BadRequest | KeyError):
     response = jsonify(rBody)
     return response, 400
 
+@app.errorhandler(ServiceUnavailable)
+def service_unavailable(e : ServiceUnavailable):
+    response = jsonify({"message" : getattr(e, "description", "Service temporarily unavailable, please retry shortly")})
+    if e.retry_after is not None:
+        response.headers["Retry-After"] = str(e.retry_after)
+    return response, 503
+
 @app.errorhandler(DISCRETE_DB_ERROR)
 def discrete_db_err(e : DISCRETE_DB_ERROR):
     r = jsonify({"message" : getattr(e, "description", "DB_ERR_500")})
@@ -91,7 +105,8 @@ def register():
 
     if userRecord and not userRecord.deleted:
         return jsonify({"message" : "This username is already registered, please log in or use a different username"}), 409
-    
+
+    pwHash : str = PASSWORD_HASHER.hash_password(password)
     try:
         # Email and username exist in a single deleted account
         single_duplication = (userRecord and not emailRecord) or (emailRecord and not userRecord) or (emailRecord and userRecord and emailRecord.id == userRecord.id)
@@ -101,8 +116,9 @@ def register():
         print(single_duplication, double_duplication)
         if single_duplication:
             # Effectively restore the account
-            db.session.execute(update(User).where(User.id == userRecord.id).values(username = uname,
-                                                password = bcrypt.generate_password_hash(password),
+            uid : int = userRecord.id if userRecord else emailRecord.id
+            db.session.execute(update(User).where(User.id == uid).values(username = uname,
+                                                password = pwHash,
                                                 email_id = email,
                                                 time_created = datetime.now(),
                                                 last_login = datetime.now(),
@@ -116,8 +132,9 @@ def register():
             restoreID = userRecord.id if purgeID != userRecord.id else emailRecord.id
             db.session.execute(delete(User).where(User.id == purgeID))  #RIP
             
+            uid : int = restoreID
             db.session.execute(update(User).where(User.id == restoreID).values(username = uname,
-                                                password = bcrypt.generate_password_hash(password),
+                                                password = pwHash,
                                                 email_id = email,
                                                 time_created = datetime.now(),
                                                 last_login = datetime.now(),
@@ -127,21 +144,22 @@ def register():
                                                 translations = 0))
         else:
             # No duplications whatsoever, we good
-            db.session.execute(insert(User).values(username = uname,
-                                                password = bcrypt.generate_password_hash(password),
+            uid : int = db.session.execute(insert(User).values(username = uname,
+                                                password = pwHash,
                                                 email_id = email,
                                                 time_created = datetime.now(),
                                                 last_login = datetime.now(),
                                                 deleted = False,
                                                 time_deleted = None,
                                                 transcriptions = 0,
-                                                translations = 0))
+                                                translations = 0)
+                                                .returning(User.id)).scalar_one()
         db.session.commit()
     except (IntegrityError, DataError, StatementError) as e:
         db.session.rollback()
         abort(500)
     
-    return jsonify({"message" : "Account Registered Successfully", "sub" : uname}), 201
+    return jsonify({"message" : "Account Registered Successfully", "sub" : uname, "uid" : uid}), 201
 
 @app.route("/validate-user", methods = ["POST"])
 @private
@@ -152,29 +170,44 @@ def validateUser():
         identity = userMetadata["identity"]
         password = userMetadata["password"]
         if "@" in identity:
-            user = db.session.execute(select(User).where(User.email_id == identity, User.deleted == False)).scalar_one_or_none()
+            user = read_session.execute(select(User).where(User.email_id == identity, User.deleted == False)).scalar_one_or_none()
         else:
-            user = db.session.execute(select(User).where(User.username == identity, User.deleted == False)).scalar_one_or_none()
+            user = read_session.execute(select(User).where(User.username == identity, User.deleted == False)).scalar_one_or_none()
 
         if not user:
             return jsonify({"message":"User does not exist"}), 404
         
-        if not bcrypt.check_password_hash(pw_hash=user.password,
-                                          password=password):
+        if not PASSWORD_HASHER.check_password(pw_hash=user.password,
+                                              password=password):
             return jsonify({"message" : "Incorrect username or password"}), 401
-        
-        return jsonify({"message" : "User Authenticated", "sub" : user.username}), 200
+
+        # The plaintext password is only ever available here, so hashes made with an outdated cost factor are upgraded on login
+        if PASSWORD_HASHER.needs_rehash(user.password):
+            try:
+                db.session.execute(update(User).where(User.id == user.id).values(password = PASSWORD_HASHER.hash_password(password)))
+                db.session.commit()
+            except (DataError, StatementError):
+                db.session.rollback()
+
+        return jsonify({"message" : "User Authenticated", "sub" : user.username, "uid" : user.id}), 200
     except KeyError:
         raise BadRequest(f"{request.method} /{request.root_path} expects mandatory fields: identity, password")
 
 @app.route("/users/<string:name>", methods = ["GET"])
+@conditional("public, no-cache")
+@tolerates_cache_bypass
 def getUser(name):
-    cached_result = RedisManager.get(f"user:{name}")
-    if cached_result:
-        return jsonify(orjson.loads(cached_result)), 200
+    # Cached as b"{id}|{public record}", so that the record can be served as stored unless usage is pending against it
+    cached_result = RedisManager.get_raw(f"user:{name}")
+    if cached_result and cached_result[:1].isdigit():
+        uid, record = cached_result.split(b"|", 1)
+        pending : dict = pending_usage(int(uid))
+        if not any(pending.values()):
+            return app.response_class(record, mimetype="application/json"), 200
+        return jsonify(merge_pending_usage(int(uid), orjson.loads(record), pending)), 200
 
     try:
-        user = db.session.execute(select(User).where(User.username == name)).scalar_one_or_none()
+        user = read_session.execute(select(User).where(User.username == name)).scalar_one_or_none()
     except:
         raise InternalServerError("An error occured in fetching user data")
 
@@ -183,8 +216,9 @@ def getUser(name):
                         "additional info" : "Make sure the name is spelt right, and that a user with the given username exists"}), 404
 
     result = user.format_to_dict()
-    RedisManager.setex(f"user:{name}", 90, orjson.dumps(result))
-    return jsonify(result), 200
+    # The user's ID is cached alongside the public record for looking up pending usage, but never returned
+    RedisManager.setex(f"user:{name}", 90, f"{user.id}|".encode() + orjson.dumps(result))
+    return jsonify(merge_pending_usage(user.id, result)), 200
 
 @app.route("/delete-account", methods = ["DELETE"])
 @CSRF_protect
@@ -206,12 +240,12 @@ def delete_account():
         raise BadRequest(f"POST /{request.path[1:]} Password missing")
     
     try:
-        uPass = db.session.execute(select(User.password).where(User.username == g.decodedToken["sub"])).scalar_one_or_none()
-        if not bcrypt.check_password_hash(uPass, password):
+        uPass = db.session.execute(select(User.password).where(User.id == g.decodedToken["uid"])).scalar_one_or_none()
+        if not PASSWORD_HASHER.check_password(uPass, password):
             raise Unauthorized("Incorrect password")
 
         db.session.execute(update(User)
-                           .where(User.username == g.decodedToken["sub"])
+                           .where(User.id == g.decodedToken["uid"])
                            .values(deleted = True, time_deleted = datetime.now()))
         db.session.commit()
     except (DataError, StatementError):
@@ -220,7 +254,7 @@ def delete_account():
     for key in app.config["PRIVATE_COMM_KEYS"]:
         try:
             requests.delete(url=f"{app.config['AUTH_COMMUNICATION_PROTOCOL']}://{app.config['AUTH_SERVER_ORIGIN']}/delete-account",
-                        headers={"refreshID" : decodedRToken["fid"], "PRIVATE-API-KEY" : key})
+                        headers={"refreshID" : decodedRToken["fid"], "sub" : g.decodedToken["sub"], "PRIVATE-API-KEY" : key})
             return jsonify({"message" : "Account Deleted Successfully"}), 204
         except:
             continue
@@ -228,8 +262,10 @@ def delete_account():
 
 @app.route("/fetch-history", methods = ["GET"])
 @token_required
+@conditional("private, no-cache", vary="Cookie")
+@tolerates_cache_bypass
 def fetch_history():
-    username : str = g.decodedToken.get("sub", None)
+    uid : int = g.decodedToken["uid"]
     try:
         filterPreference : int = int(request.args.get("filter", 0))
     except:
@@ -239,46 +275,22 @@ def fetch_history():
     except:
         sortPreference = 0
 
+    rawCursor : Optional[str] = request.args.get("cursor")
+    cursor : Optional[tuple] = decode_history_cursor(rawCursor) if rawCursor else None
+
+    perPage : int = 10
+    descending : bool = sortPreference == 0
+    kind : Optional[str] = FILTERS.get(filterPreference)
+
+    # Served straight from the user's timeline, unless the page lies past its depth
+    entries = timeline.fetch_page(uid, kind, descending, cursor, perPage)
+    if entries is not None:
+        return history_page([payload for *_, payload in entries],
+                            [(time_requested, entry_type, entry_id) for time_requested, entry_type, entry_id, _ in entries],
+                            perPage)
+
     try:
-        currentPage : int = int(request.args.get("page", 1))
-    except ValueError:
-        raise BadRequest(f"POST /{request.path[1:]} Requires an integer to indicate value result")
-    
-    cached_result = RedisManager.get(f"uh:{username}:{filterPreference}_{sortPreference}_{currentPage}")
-    if cached_result:
-        return jsonify(orjson.loads(cached_result))
-
-    perPage : int = 10 + 1
-
-    transcriptionQuery =(select(Transcription_Request.id,
-                                Transcription_Request.time_requested.label("time_requested"),
-                                Transcription_Request.transcripted_text.label("content"),
-                                Transcription_Request.language.label("lang"),
-                                literal("transcription").label("type"),
-                                literal(None).label("src"),
-                                literal(None).label("dst"),
-                                ).where(Transcription_Request.requested_by == username))
-
-    translationQuery = (select(Translation_Request.id,
-                              Translation_Request.time_requested.label("time_requested"),
-                              Translation_Request.translated_text.label("content"),
-                              literal(None).label("lang"),
-                              literal("translation").label("type"),
-                              Translation_Request.language_from.label("src"),
-                              Translation_Request.language_to.label("dst"),
-                              ).where(Translation_Request.requested_by == username))
-
-    combinedQuery = (transcriptionQuery.union_all(translationQuery)
-                    .order_by(db.desc("time_requested") if sortPreference == 0 else db.asc("time_requested"))
-                    .limit(perPage)
-                    .offset((currentPage - 1) * perPage))
-    try:
-        if filterPreference == 2:
-            qResult = db.session.execute(transcriptionQuery.order_by(Transcription_Request.time_requested.desc() if sortPreference == 0 else Transcription_Request.time_requested.asc()).limit(perPage).offset((currentPage -1) * perPage))
-        elif filterPreference == 1:
-            qResult = db.session.execute(translationQuery.order_by(Translation_Request.time_requested.desc() if sortPreference == 0 else Translation_Request.time_requested.asc()).limit(perPage).offset((currentPage -1) * perPage))
-        else:
-            qResult = db.session.execute(combinedQuery)
+        qResult = read_session.execute(history_query(uid, kind, cursor, descending, perPage + 1))
     except (IntegrityError, DataError) as e:
         e = SQLAlchemyError
         e.__setattr__("description", "Seems to be an error with our database service. Please try again later, or contact support")
@@ -287,16 +299,38 @@ def fetch_history():
     except Exception as e:
         raise DISCRETE_DB_ERROR()
 
-    pyReadableResult : list = [row._asdict() for row in qResult]
-
-    if currentPage <= 3:
-        RedisManager.setex(f"uh:{username}:{filterPreference}_{sortPreference}_{currentPage}", 120, orjson.dumps(pyReadableResult))
-
-    resposne = jsonify(pyReadableResult[:-1])
-    if len(pyReadableResult) < perPage:
+    rows : list = [row._asdict() for row in qResult]
+    return history_page([orjson.dumps(row) for row in rows],
+                        [(row["time_requested"], row["type"], row["id"]) for row in rows],
+                        perPage)
+
+def history_page(payloads : list[bytes], keys : list[tuple], perPage : int):
+    '''Build a history response from up to perPage + 1 serialized entries, the extra entry only indicating that more history exists'''
+    resposne = app.response_class(b"[" + b",".join(payloads[:perPage]) + b"]", mimetype="application/json")
+    if len(payloads) > perPage:
+        resposne.headers["next-cursor"] = encode_history_cursor(*keys[perPage - 1])
+    else:
         resposne.headers["exhausted"] = True
     return resposne, 200
 
+@app.route("/export-history", methods = ["GET"])
+@token_required
+def export_user_history():
+    try:
+        filterPreference : int = int(request.args.get("filter", 0))
+    except:
+        filterPreference = 0
+
+    chunks = export_history(g.decodedToken["uid"], FILTERS.get(filterPreference), app.config["HISTORY_EXPORT_BATCH_SIZE"])
+    compress : bool = "gzip" in request.accept_encodings
+    # Rows are fetched lazily while the response is sent, so the session must outlive this view
+    response = app.response_class(stream_with_context(gzip_chunks(chunks) if compress else chunks), mimetype="application/x-ndjson")
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Content-Disposition"] = "attachment; filename=history.ndjson"
+    return response, 200
+
 @app.route("/transcript-speech", methods = ["POST"])
 @CSRF_protect
 @enforce_mimetype("form-data")
@@ -306,39 +340,50 @@ def transcript_speech():
     if audio_file is None:
         raise BadRequest("Audio File Not Found in Request Object\nAt:POST /transcript-speech")
     
-    if audio_file.content_length and audio_file.content_type > 25*1024*1024:
-        raise BadRequest("Very large file, cannot process!")
-    
-    starting_time = time.time()
-    #Saving file
-    filepath : str = os.path.join(app.config["UPLOAD_FOLDER"], audio_file.filename)
-    audio_file.save(filepath)
-
-    if os.path.getsize(filepath) > 25*1024*1024:
-        os.remove(filepath)
-        raise BadRequest("Very large file, cannot process!")
+    if not (audio_file.filename or "").lower().endswith((".mp3", ".wav", ".aac", ".ogg")):
+        raise BadRequest("Audio file must be of format mp3, aac, wav, or ogg")
 
-    result = getAudioTranscription(filepath)
-    time_taken = starting_time - time.time()
+    # File parts are spooled through babel.uploads.BoundedSpool, which has already enforced MAX_AUDIO_SIZE and hashed the audio while parsing
     try:
-        db.session.execute(insert(Transcription_Request)
-                           .values(requested_by=g.decodedToken["sub"],
-                                   language="en",
-                                   transcripted_text=result["text"],
-                                   time_requested=datetime.fromtimestamp(starting_time)))
-        db.session.execute(update(User)
-                           .where(User.id == g.decodedToken["sub"], User.deleted == False)
-                           .values(transcriptions=User.transcriptions + 1))
-        db.session.commit()
-    except (IntegrityError, DataError, ValueError, CompileError):
-        db.session.rollback()
-        abort(500)
-    return jsonify({"text" : result["text"], "confidence" : result["confidence"], "time" : time_taken}), 200
+        job : dict = submit_transcription_job(audio_file.stream, audio_file.stream.hexdigest(), g.decodedToken["uid"])
+    except requests.RequestException:
+        raise InternalServerError("Failed to upload audio for transcription, please try again later")
+    finally:
+        audio_file.close()
+
+    job.pop("owner")
+    job["location"] = f"/transcription-jobs/{job['id']}"
+    response = jsonify(job)
+    response.headers["Location"] = job["location"]
+    return response, 200 if job["status"] == "completed" else 202
+
+@app.route("/transcription-jobs/<string:job_id>", methods = ["GET"])
+@CSRF_protect
+@token_required
+def transcription_job_status(job_id):
+    job : dict = fetch_job(job_id)
+    if not job or job.pop("owner") != g.decodedToken["uid"]:
+        raise NotFound()
+    return jsonify(job), 200
+
+@app.route("/assemblyai-webhook", methods = ["POST"])
+@enforce_mimetype("JSON")
+def assemblyai_webhook():
+    if not (aai_config.WEBHOOK_SECRET and
+            secrets.compare_digest(request.headers.get(aai_config.WEBHOOK_AUTH_HEADER, ""), aai_config.WEBHOOK_SECRET)):
+        raise Unauthorized("Invalid webhook credentials")
+
+    transcript_id = request.get_json(force=True, silent=False)["transcript_id"]
+    # The worker waiting on this transcript may be in another process
+    if not TRANSCRIPT_POLLER.notify(transcript_id):
+        RedisManager.publish(aai_config.WEBHOOK_CHANNEL, transcript_id)
+    return jsonify({"message" : "Acknowledged"}), 200
 
 @app.route("/translate-text", methods = ["POST"])
 @CSRF_protect
 @enforce_mimetype("JSON")
 @token_required
+@tolerates_cache_bypass
 def translate_text():
     try:
         translation_request = request.get_json(force=True, silent=False)
@@ -350,10 +395,6 @@ def translate_text():
         src_language : str = translation_request.get("src", None)
         src_language = None if src_language.strip() == "" else src_language.lower()
 
-        cached_result = RedisManager.get("TL:" + str(zlib.adler32(f"{g.decodedToken['sub']}:{src_language}-{dest_language}-{original_text}".encode())))
-        if cached_result:
-            return jsonify(orjson.loads(cached_result)), 200
-
         #Validating strings
         if original_text.strip() == "" or dest_language.strip() == "":
             raise ValueError()
@@ -364,35 +405,37 @@ def translate_text():
         if src_language is not None and src_language not in AVAILABLE_LANGUAGES and src_language != "auto":
             return jsonify({"error" : "Source Language Not Found"}), 404
 
-        #Initialize Translation Process
+        # Translations are cached across users, history is still recorded per user
         start_time = time.time()
-        translator = Translator()
+        cache_key : str = translation_cache_key(src_language, dest_language, original_text)
+        # Cached translations are served as stored, and only parsed for recording history
+        payload : Optional[bytes] = fetch_cached_payloads([cache_key])[0]
+        if payload:
+            result : dict = orjson.loads(payload)
+        else:
+            result = translate_single_flight(cache_key, original_text, dest_language, src_language)
 
-        translation_metadata = translator.translate(text = original_text, dest = dest_language, src = src_language or 'auto')
-        translated_text, translation_src = translation_metadata.text, translation_metadata.src
-        time_taken = time.time() - start_time
         try:
-            db.session.execute(insert(Translation_Request)
-                               .values(requested_by=g.decodedToken["sub"],
-                                        language_from=translation_src,
-                                        language_to=dest_language,
-                                        requested_text=original_text,
-                                        translated_text=translated_text,
-                                        time_requested=datetime.fromtimestamp(start_time))
-                                )
-            db.session.execute(update(User)
-                               .where(User.username == g.decodedToken["sub"], User.deleted == False)
-                               .values(translations = User.translations + 1))
+            time_requested : datetime = datetime.fromtimestamp(start_time)
+            translationID : int = db.session.execute(insert(Translation_Request)
+                                                     .values(requested_by=g.decodedToken["uid"],
+                                                             language_from=result["src"],
+                                                             language_to=dest_language,
+                                                             requested_text=original_text,
+                                                             translated_text=result["translated-text"],
+                                                             time_requested=time_requested)
+                                                     .returning(Translation_Request.id)).scalar_one()
             db.session.commit()
         except (IntegrityError, DataError, StatementError):
             db.session.rollback()
             abort(500)
 
-
-        RedisManager.setex("TL:" + str(zlib.adler32(f"{g.decodedToken['sub']}:{src_language}-{dest_language}-{original_text}".encode())),
-                           120,
-                           orjson.dumps({"translated-text" : translated_text, "src" : translation_src, "time" : time_taken}))
-        return jsonify({"translated-text" : translated_text, "src" : translation_src, "time" : time_taken}), 200
+        record_usage(g.decodedToken["uid"], "translations")
+        timeline.append(g.decodedToken["uid"],
+                        [translation_entry(translationID, time_requested, result["translated-text"], result["src"], dest_language)])
+        if payload:
+            return app.response_class(payload, mimetype="application/json"), 200
+        return jsonify(result), 200
 
     except BadRequest as e:
         print("NOT JSON")
@@ -401,15 +444,95 @@ def translate_text():
         print("JSON NOT PROPER KWARGS")
         return jsonify("Invalid Request"), 400
 
-@app.route("/fetch-languages", methods = ["GET"])
-def fetch_languages():
-    global LANG_CACHE
-    if LANG_CACHE:
-        return jsonify(LANG_CACHE), 200
+@app.route("/translate-batch", methods = ["POST"])
+@CSRF_protect
+@enforce_mimetype("JSON")
+@token_required
+@tolerates_cache_bypass
+def translate_batch():
+    batch = request.get_json(force=True, silent=False)
+    items = batch.get("items") if isinstance(batch, dict) else batch
+    if not isinstance(items, list) or not items:
+        raise BadRequest(f"POST /{request.path[1:]} expects a non-empty list of items, each with text, dest and optionally src")
+    if len(items) > app.config["TRANSLATION_BATCH_LIMIT"]:
+        raise BadRequest(f"POST /{request.path[1:]} accepts at most {app.config['TRANSLATION_BATCH_LIMIT']} items per batch")
+
+    requested : list[tuple] = []
+    for index, item in enumerate(items):
+        try:
+            original_text : str = item["text"]
+            dest_language : str = item["dest"].strip().lower()
+            src_language : str = (item.get("src") or "").strip().lower() or None
+        except (KeyError, TypeError, AttributeError):
+            raise BadRequest(f"Item {index} must contain text, dest and optionally src")
+
+        if not isinstance(original_text, str) or original_text.strip() == "" or dest_language == "":
+            raise BadRequest(f"Item {index} must contain non-empty text and dest")
+        # Same limit as POST /translate-text, applied per item
+        if len(original_text.encode("utf-8")) > 8192:
+            raise BadRequest(f"Item {index}: Maximum text size of 8192 bytes exceeded")
+        if dest_language not in AVAILABLE_LANGUAGES:
+            raise BadRequest(f"Item {index}: Destination Language Not Found")
+        if src_language is not None and src_language not in AVAILABLE_LANGUAGES and src_language != "auto":
+            raise BadRequest(f"Item {index}: Source Language Not Found")
+        requested.append((src_language, dest_language, original_text))
+
+    # Identical items are translated once, cache hits are fetched in one round trip
+    unique : list[tuple] = list(dict.fromkeys(requested))
+    cache_keys : dict[tuple, str] = {item : translation_cache_key(*item) for item in unique}
+    results : dict = {item : cached for item, cached in zip(unique, fetch_cached_translations(list(cache_keys.values()))) if cached}
+
+    start_time = time.time()
+    # Run in copies of this context, so that workers honour this endpoint's tolerance of a cache bypass
+    futures = {item : TRANSLATION_EXECUTOR.submit(contextvars.copy_context().run, translate_single_flight, cache_keys[item], item[2], item[1], item[0])
+               for item in unique if item not in results}
+    for item, future in futures.items():
+        try:
+            results[item] = future.result()
+        except Exception:
+            print(traceback.format_exc())
+
+    # History is recorded for every successfully translated item, cached or not
+    recorded : list[tuple] = [item for item in requested if item in results]
+    if recorded:
+        try:
+            time_requested : datetime = datetime.fromtimestamp(start_time)
+            translationIDs : list[int] = db.session.execute(insert(Translation_Request)
+                                                            .returning(Translation_Request.id, sort_by_parameter_order=True),
+                                                            [{"requested_by" : g.decodedToken["uid"],
+                                                              "language_from" : results[item]["src"],
+                                                              "language_to" : item[1],
+                                                              "requested_text" : item[2],
+                                                              "translated_text" : results[item]["translated-text"],
+                                                              "time_requested" : time_requested}
+                                                              for item in recorded]).scalars().all()
+            db.session.commit()
+        except (IntegrityError, DataError, StatementError):
+            db.session.rollback()
+            abort(500)
+
+        record_usage(g.decodedToken["uid"], "translations", len(recorded))
+        timeline.append(g.decodedToken["uid"],
+                        [translation_entry(translationID, time_requested, results[item]["translated-text"], results[item]["src"], item[1])
+                         for translationID, item in zip(translationIDs, recorded)])
 
-    available_languages = {"auto" : "auto-detect"}
-    available_languages.update(AVAILABLE_LANGUAGES)
+    failure : dict = {"error" : "Failed to translate this item, please try again later"}
+    return jsonify({"translations" : [results.get(item, failure) for item in requested]}), 200
 
-    LANG_CACHE = available_languages
+@app.route("/translation-cache-stats", methods = ["GET"])
+@private
+def translation_cache_stats():
+    return jsonify(cache_stats()), 200
 
-    return jsonify(available_languages), 200
\ No newline at end of file
+@app.route("/cache-health", methods = ["GET"])
+@private
+def cache_health():
+    return jsonify({"circuit_breaker" : RedisManager.breaker_stats(),
+                    "near_cache" : RedisManager.near_cache_stats()}), 200
+
+@app.route("/fetch-languages", methods = ["GET"])
+@conditional("public, max-age=31536000, immutable")
+def fetch_languages():
+    response = app.response_class(LANGUAGES_BODY, mimetype="application/json")
+    response.set_etag(LANGUAGES_ETAG)
+    return response
\ No newline at end of file
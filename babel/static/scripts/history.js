@@ -1,6 +1,9 @@
-async function getHistory(sortOption, filterOption, pageNumber = 1) {
+let nextCursor = null;
+
+async function getHistory(sortOption, filterOption, cursor = null) {
     try {
-        const response = await fetch(`/fetch-history?sort=${sortOption}&filter=${filterOption}&page=${pageNumber}`, {
+        const cursorParam = cursor ? `&cursor=${encodeURIComponent(cursor)}` : "";
+        const response = await fetch(`/fetch-history?sort=${sortOption}&filter=${filterOption}${cursorParam}`, {
             method: "GET",
             credentials: "include",
             headers: {
@@ -19,6 +22,7 @@ async function getHistory(sortOption, filterOption, pageNumber = 1) {
             throw new Error(`${response.status}: ${response.statusText}. Failed to fetch history`);
         }
         isExhausted = response.headers.get("exhausted");
+        nextCursor = response.headers.get("next-cursor");
         
         results = await response.json();
         const parent = document.querySelector(".history-list");
@@ -69,8 +73,7 @@ async function getHistory(sortOption, filterOption, pageNumber = 1) {
 }
 document.addEventListener("DOMContentLoaded", function (event) {
     //Initial Load
-    getHistory(0, 0, 1);
-    let currentPage = 1;
+    getHistory(0, 0);
     const sortBtn = document.getElementById("sort");
     const filterBtn = document.getElementById("filter");
 
@@ -79,21 +82,18 @@ document.addEventListener("DOMContentLoaded", function (event) {
         selectionBtn.addEventListener("input", () => {
             const parent = document.querySelector(".history-list");
             parent.innerHTML = "";
-            currentPage = 1;
-            getHistory(sortBtn.value, filterBtn.value, currentPage)
+            getHistory(sortBtn.value, filterBtn.value)
         });
         selectionBtn.addEventListener("change", () => {
             const parent = document.querySelector(".history-list");
             parent.innerHTML = "";  
-            currentPage = 1;
-            getHistory(sortBtn.value, filterBtn.value, currentPage)
+            getHistory(sortBtn.value, filterBtn.value)
         });
     })
 
 
     const loadMoreBtn = document.getElementById("load-more");
     loadMoreBtn.addEventListener("click", () => {
-        currentPage++;
-        getHistory(sortBtn.value, filterBtn.value, currentPage);
+        getHistory(sortBtn.value, filterBtn.value, nextCursor);
     })
 })
\ No newline at end of file
@@ -1,3 +1,33 @@
+async function pollTranscriptionJob(location, interval = 2000) {
+    while (true) {
+        const response = await fetch(location, {
+            method: "GET",
+            headers : {
+                "X-CSRF-TOKEN" : localStorage.getItem("X-CSRF-TOKEN"),
+                "X-CLIENT-TYPE" : "web"
+            },
+            credentials : "include"
+        });
+        const csrfToken = response.headers.get("X-CSRF-TOKEN");
+        if (csrfToken) {
+            localStorage.setItem("X-CSRF-TOKEN", csrfToken);
+        }
+
+        if (!response.ok) {
+            throw new Error(`An error occured in fetching the transcription job:\nStatus: ${response.status}\nMessage: ${response.statusText}`);
+        }
+
+        const job = await response.json();
+        if (job["status"] === "completed") {
+            return job;
+        }
+        if (job["status"] === "failed") {
+            throw new Error(`Transcription failed: ${job["error"]}`);
+        }
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+}
+
 document.addEventListener("DOMContentLoaded", async function (event) {
     const audio_dropper = document.getElementById("audio-dropper");
     const audio_label = document.getElementById("audio-label").querySelector("span");
@@ -57,8 +87,8 @@ document.addEventListener("DOMContentLoaded", async function (event) {
                 throw new Error(`An error occured in getting the transcript:\nStatus: ${response.status}\nMessage: ${response.statusText}`);
             }
 
-
-            const data = await response.json();
+            const job = await response.json();
+            const data = job["status"] === "completed" ? job : await pollTranscriptionJob(job["location"]);
             const transcript = data["text"];
             const confidence = data["confidence"];
 
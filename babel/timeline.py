@@ -0,0 +1,121 @@
+from babel import app, read_session, RedisManager
+from babel.history import HistoryKind, history_query, is_past_cursor, transcription_entry, translation_entry
+from datetime import datetime, timedelta
+from typing import Optional
+import orjson
+
+# Per-user history timelines, kept in Redis sorted sets scored by time of request (in microseconds).
+# Members are the JSON payload of a history entry prefixed by "{type}:{id}|", so that entries sharing a timestamp are ordered by (type, id) just like in SQL.
+# Every timeline holds at most TIMELINE_DEPTH entries, older history is served from the database
+
+EPOCH = datetime(1970, 1, 1)
+
+# Users whose appends were dropped while Redis was bypassed. Their timelines are marked for rebuilding once Redis is reachable again
+_UNSYNCED : set[int] = set()
+
+def timeline_key(uid : int, kind : Optional[HistoryKind] = None) -> str:
+    return f"utl:{kind or 'all'}:{uid}"
+
+def built_key(uid : int) -> str:
+    return f"utl:built:{uid}"
+
+def to_score(time_requested : datetime) -> int:
+    return (time_requested - EPOCH) // timedelta(microseconds=1)
+
+def from_score(score : float) -> datetime:
+    return EPOCH + timedelta(microseconds=int(score))
+
+def encode_member(entry : dict) -> bytes:
+    return f"{entry['type']}:{entry['id']:012d}|".encode() + orjson.dumps(entry)
+
+def split_member(member : bytes) -> tuple[str, int, bytes]:
+    prefix, payload = member.split(b"|", 1)
+    entry_type, entry_id = prefix.decode().split(":")
+    return entry_type, int(entry_id), payload
+
+def resync() -> None:
+    if not _UNSYNCED:
+        return
+    uids : list[int] = list(_UNSYNCED)
+    if RedisManager.delete(*(built_key(uid) for uid in uids)) is not None:
+        _UNSYNCED.difference_update(uids)
+
+def append(uid : int, entries : list[dict]) -> None:
+    '''Add freshly recorded history entries to the user's timelines, trimming them to TIMELINE_DEPTH'''
+    if not entries:
+        return
+    resync()
+    grouped : dict[str, list[dict]] = {timeline_key(uid) : entries}
+    for entry in entries:
+        grouped.setdefault(timeline_key(uid, entry["type"]), []).append(entry)
+
+    pipeline = RedisManager.pipeline()
+    try:
+        with pipeline:
+            for key, group in grouped.items():
+                pipeline.zadd(key, {encode_member(entry) : to_score(entry["time_requested"]) for entry in group})
+                pipeline.zremrangebyrank(key, 0, -(app.config["TIMELINE_DEPTH"] + 1))
+            # Every timeline is kept alive together with the built marker, even those of kinds not appended to,
+            # since a timeline that expired under a live marker would pass for an empty (and complete) one
+            for key in (timeline_key(uid), timeline_key(uid, "transcription"), timeline_key(uid, "translation")):
+                pipeline.expire(key, app.config["TIMELINE_TTL"])
+            pipeline.expire(built_key(uid), app.config["TIMELINE_TTL"] - 1)
+    finally:
+        if pipeline.results is None:
+            _UNSYNCED.add(uid)
+
+def rebuild(uid : int) -> None:
+    '''Load the latest TIMELINE_DEPTH entries of each kind from the database into the user's timelines'''
+    depth : int = app.config["TIMELINE_DEPTH"]
+    entries : list[dict] = []
+    for kind in ("transcription", "translation"):
+        for row in read_session.execute(history_query(uid, kind, None, True, depth)):
+            if kind == "transcription":
+                entries.append(transcription_entry(row.id, row.time_requested, row.content, row.lang))
+            else:
+                entries.append(translation_entry(row.id, row.time_requested, row.content, row.src, row.dst))
+
+    # Appends made while this user was cold went to the timelines regardless, so existing members are kept
+    RedisManager.setex(built_key(uid), app.config["TIMELINE_TTL"] - 1, 1)
+    append(uid, entries)
+
+def fetch_page(uid : int, kind : Optional[HistoryKind], descending : bool, cursor : Optional[tuple], perPage : int) -> Optional[list[tuple[datetime, str, int, bytes]]]:
+    '''Fetch up to perPage + 1 entries past the cursor as (time_requested, type, id, JSON payload),
+    or None if the page lies beyond the timeline's depth (or Redis is bypassed) and must be served from the database'''
+    resync()
+    built = RedisManager.exists(built_key(uid))
+    if built is None:
+        return None
+    if not built:
+        rebuild(uid)
+
+    key : str = timeline_key(uid, kind)
+    timelineSize = RedisManager.zcard(key)
+    if timelineSize is None:
+        return None
+    # A timeline shorter than its depth was never trimmed, and so holds the user's entire history
+    complete : bool = timelineSize < app.config["TIMELINE_DEPTH"]
+    if not (descending or complete):
+        return None
+
+    cursor_score : Optional[int] = to_score(cursor[0]) if cursor else None
+    bound = cursor_score if cursor else ("+inf" if descending else "-inf")
+    entries : list = []
+    offset : int = 0
+    while len(entries) <= perPage:
+        members = RedisManager.zrange_byscore(key, bound, "-inf" if descending else "+inf", rev=descending, offset=offset, count=perPage + 1)
+        if members is None:
+            return None
+        for member, score in members:
+            entry_type, entry_id, payload = split_member(member)
+            # The score bound is inclusive, skip entries sharing the cursor's timestamp that were already served
+            if cursor and score == cursor_score and not is_past_cursor(entry_type, entry_id, cursor[1], cursor[2], descending):
+                continue
+            entries.append((from_score(score), entry_type, entry_id, payload))
+        if len(members) <= perPage:
+            break
+        offset += len(members)
+
+    if len(entries) <= perPage and not complete:
+        return None
+    return entries[:perPage + 1]
@@ -1,31 +1,36 @@
-import requests, time, os
+import requests
+from babel import RedisManager
 from babel.config import aai_config
-from typing import Union, Optional
+from babel.poller import TranscriptPoller
+from babel.uploads import iter_chunks
+from typing import Union, Optional, IO
 
-from auxillary_packages.errors import API_TIMEOUT_ERROR
+def build_headers(api_key : str = aai_config.AAI_API_KEY) -> dict:
+    if not api_key.isalnum():
+        raise ValueError(f"ASSEMBLY-AI API KEY IS INVALID. MUST BE STRINCTLY ALPHA-NUMERIC, NOT {api_key}")
 
-def upload_audio(headers : dict, file_path : str) -> Optional[str]:
-    """Uploads audio file to AssemblyAI
+    return {
+        "Authorization" : api_key,
+        "Content-Type" : "application/json"
+    }
+
+def upload_audio(headers : dict, audio_stream : IO[bytes]) -> Optional[str]:
+    """Uploads spooled audio to AssemblyAI in chunks (chunked transfer encoding), without reading the whole spool into memory at once
 
     params:
-    file_path: Path of the audio file
+    audio_stream: Readable binary stream of the audio file
     headers: dictionary containting headers
 
     returns:
     URL of the audio saved on AssemblyAI's servers
     """
-    if not isinstance(file_path, str):
-        raise TypeError("Filepath must be a string instance")
-    if not os.path.isfile(file_path):
-        raise FileNotFoundError("Filepath not found")
-    if not file_path.endswith((".mp3", ".wav", ".aac")):
-        raise ValueError("Filepath must be an audio file, with format as mp3, aac, or wav")
+    if not (hasattr(audio_stream, "read") and hasattr(audio_stream, "seek")):
+        raise TypeError("Audio stream must be a seekable binary stream")
     
-    # try:
-    with open(file_path, 'rb') as file:
-        response = requests.post(aai_config.UPLOAD_URL, headers=headers, files={'file': file})
+    response = requests.post(aai_config.UPLOAD_URL,
+                             headers=dict(headers, **{"Content-Type" : "application/octet-stream"}),
+                             data=iter_chunks(audio_stream))
     response.raise_for_status()
-    print(response.json())
     return response.json()['upload_url']
 
 def transcribe_audio(headers : dict, audio_url : str) -> Union[str, int]:
@@ -41,8 +46,13 @@ def transcribe_audio(headers : dict, audio_url : str) -> Union[str, int]:
     if not (isinstance(audio_url, str) and isinstance(headers, dict)):
         raise TypeError("Audio URL must be a string instance")
     
+    payload : dict = {'audio_url': audio_url}
+    if aai_config.WEBHOOK_URL:
+        payload.update({'webhook_url' : aai_config.WEBHOOK_URL,
+                        'webhook_auth_header_name' : aai_config.WEBHOOK_AUTH_HEADER,
+                        'webhook_auth_header_value' : aai_config.WEBHOOK_SECRET})
     try:
-        response = requests.post(aai_config.TRANSCRIPT_URL, json={'audio_url': audio_url}, headers=headers)
+        response = requests.post(aai_config.TRANSCRIPT_URL, json=payload, headers=headers)
         response.raise_for_status()
         return response.json()['id']
     except requests.HTTPError as e:
@@ -50,7 +60,7 @@ def transcribe_audio(headers : dict, audio_url : str) -> Union[str, int]:
     except KeyError as e:
         print("Unexpected response format from AssemblyAI (Key 'id' not found in JSON serialized form)\n{}".format(response.json()))
 
-def check_transcription_status(headers : dict, transcript_id : Union[str, int], trancript_url : str = aai_config.TRANSCRIPT_URL) -> str:
+def check_transcription_status(headers : dict, transcript_id : Union[str, int], trancript_url : str = aai_config.TRANSCRIPT_URL) -> Optional[dict]:
     """Checks the status of the transcription"""
 
     if not (isinstance(trancript_url, str) and isinstance(transcript_id, (int, str)) and isinstance(headers, dict)):
@@ -64,48 +74,37 @@ def check_transcription_status(headers : dict, transcript_id : Union[str, int],
         print("AssemblyAI responded with an error: {}".format(response.status_code))
     except KeyError as e:
         print("Unexpected response format from AssemblyAI (Key 'status' not found in JSON serialized form)\n{}".format(response.json()))
+    except requests.RequestException as e:
+        print("Failed to reach AssemblyAI: {}".format(e))
+
+TRANSCRIPT_POLLER = TranscriptPoller(status_fetcher=check_transcription_status,
+                                     min_interval=aai_config.POLL_MIN_INTERVAL,
+                                     max_interval=aai_config.POLL_MAX_INTERVAL,
+                                     webhook_fallback_interval=aai_config.WEBHOOK_FALLBACK_INTERVAL if aai_config.WEBHOOK_URL else None)
+if aai_config.WEBHOOK_URL:
+    TRANSCRIPT_POLLER.listen(RedisManager.pubsub, aai_config.WEBHOOK_CHANNEL)
 
-def getAudioTranscription(filepath : str, api_key : str = aai_config.AAI_API_KEY, max_attempts : int = 50, poll_interval : int = 4) -> dict:
-    ''' ### Performs the actual transcription for a given audio file
+def getAudioTranscription(audio_url : str, api_key : str = aai_config.AAI_API_KEY, timeout : float = aai_config.POLL_TIMEOUT, audio_duration : Optional[float] = None) -> dict:
+    ''' ### Performs the actual transcription for an audio file uploaded through upload_audio()
 
     params:
 
-    filepath: The path of the audio file to be transcribed
+    audio_url: URL obtained from upload_audio()
     key: The API key for Assembly AI
-    max_attempts: Number of times to poll AssemblyAI's API endpoint before exiting the function
-    poll_interval: Time interval to wait between consecutive polls
+    timeout: Seconds to wait for AssemblyAI to complete the transcript before exiting the function
+    audio_duration: Estimated duration of the audio in seconds, pacing checks on the transcript until AssemblyAI reports the actual one
     
     returns: dictionary object with text attribute set to the transcripted text and confidence attribute set to the average confidence of the words
     '''
-    #Initialize headers
-    if not api_key.isalnum():
-        raise ValueError(f"ASSEMBLY-AI API KEY IS INVALID. MUST BE STRINCTLY ALPHA-NUMERIC, NOT {api_key}")
-
-    headers = {
-        "Authorization" : api_key,
-        "Content-Type" : "application/json"
-    }
-
-    audio_url = upload_audio(headers, filepath)
-    if audio_url is None:
-        raise requests.HTTPError("Max tries exceeded with AssemblyAI")
+    headers = build_headers(api_key)
     
     transcription_id = transcribe_audio(headers, audio_url)
+    if transcription_id is None:
+        raise RuntimeError("Transcription Failed")
 
-    
-    for _ in range(max_attempts):
-        result = check_transcription_status(headers, transcription_id)
-        if result['status'] == "completed":
-            print("Transcription Done\n")
-            overall_confidence = sum(item['confidence'] for item in result['words']) / len(result['words'])
+    # Shared poller raises API_TIMEOUT_ERROR on timeout, and RuntimeError if AssemblyAI reports a failure
+    result = TRANSCRIPT_POLLER.wait(transcription_id, headers, timeout, audio_duration=audio_duration)
+    print("Transcription Done\n")
+    overall_confidence = sum(item['confidence'] for item in result['words']) / len(result['words']) if result['words'] else 0
 
-            return {"text" : result["text"], "confidence" : overall_confidence}
-        elif result['status'] == "error":
-            print("Transcription Failed")
-            print(result)
-            raise RuntimeError("Transcription Failed")
-        
-        time.sleep(poll_interval)
-    
-    #Loop exit indicates overflow of maximum attempts
-    raise API_TIMEOUT_ERROR(endpoint=aai_config.TRANSCRIPT_URL)
\ No newline at end of file
+    return {"text" : result["text"], "confidence" : overall_confidence}
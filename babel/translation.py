@@ -0,0 +1,87 @@
+from babel import app, RedisManager, TRANSLATOR_POOL
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import hashlib
+import orjson
+import secrets
+import time
+import unicodedata
+
+# Upstream calls for batches fan out over this executor, bounded by the translator pool anyways
+TRANSLATION_EXECUTOR = ThreadPoolExecutor(max_workers=app.config["TRANSLATOR_POOL_SIZE"],
+                                          thread_name_prefix="translation")
+
+CACHE_HITS_KEY = "stats:translation-cache:hits"
+CACHE_MISSES_KEY = "stats:translation-cache:misses"
+
+def normalize_text(text : str) -> str:
+    '''Canonical form of a text for caching purposes: NFC-normalized, with whitespace runs collapsed'''
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def translation_cache_key(src : Optional[str], dest : str, text : str) -> str:
+    '''Cache key shared by all users, keyed by a SHA-256 digest of the language pair and normalized text'''
+    digest = hashlib.sha256("\x1f".join((src or "auto", dest, normalize_text(text))).encode()).hexdigest()
+    return f"TLS:{digest}"
+
+def fetch_cached_payloads(keys : list[str]) -> list[Optional[bytes]]:
+    '''Fetch cached translations for the given keys in one round trip as serialized JSON, recording hits and misses'''
+    cached = RedisManager.mget_raw(keys) or [None] * len(keys)
+    hits = sum(1 for result in cached if result)
+    with RedisManager.pipeline() as pipeline:
+        if hits:
+            pipeline.incrby(CACHE_HITS_KEY, hits)
+        if hits != len(keys):
+            pipeline.incrby(CACHE_MISSES_KEY, len(keys) - hits)
+    return cached
+
+def fetch_cached_translations(keys : list[str]) -> list[Optional[dict]]:
+    return [orjson.loads(result) if result else None for result in fetch_cached_payloads(keys)]
+
+def cache_translations(results : dict[str, dict]) -> None:
+    '''Cache translations keyed by their cache keys'''
+    RedisManager.mset_ex({key : orjson.dumps(result) for key, result in results.items()}, app.config["TRANSLATION_CACHE_TTL"])
+
+def translate_single_flight(cache_key : str, text : str, dest : str, src : Optional[str] = None) -> dict:
+    '''Translate a cache miss, letting only one worker across all processes call upstream per cache key.
+    Others wait for its result to land in the cache, and fall back to calling upstream themselves on timeout'''
+    pending_key : str = f"TLP:{cache_key}"
+    # Unique to this leader, so that a leader outliving its lock never releases the one taken by the next
+    token : str = secrets.token_hex(16)
+    if RedisManager.set(pending_key, token, ex=app.config["TRANSLATION_LOCK_TTL"], nx=True):
+        try:
+            result = translate(text, dest, src)
+            cache_translations({cache_key : result})
+            return result
+        finally:
+            RedisManager.delete_if_equals(pending_key, token)
+
+    interval : float = 0.02
+    deadline : float = time.monotonic() + app.config["TRANSLATION_WAIT_TIMEOUT"]
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        interval = min(interval * 2, 0.25)
+        cached = RedisManager.get_raw(cache_key)
+        if cached:
+            return orjson.loads(cached)
+        if not RedisManager.exists(pending_key):
+            # Leader gave up without caching a result
+            break
+
+    result = translate(text, dest, src)
+    cache_translations({cache_key : result})
+    return result
+
+def cache_stats() -> dict:
+    hits, misses = (int(count or 0) for count in RedisManager.mget([CACHE_HITS_KEY, CACHE_MISSES_KEY]))
+    return {"hits" : hits, "misses" : misses, "hit_rate" : hits / (hits + misses) if hits + misses else None,
+            "near_cache" : RedisManager.near_cache_stats()}
+
+def translate(text : str, dest : str, src : Optional[str] = None) -> dict:
+    '''Translate text through a pooled translator client
+
+    returns: dictionary with translated-text, src (detected if not given) and time taken'''
+    start_time = time.time()
+    with TRANSLATOR_POOL.borrow() as translator:
+        # Normalization only applies to cache keys, upstream gets the text as written so that line breaks survive translation
+        translation_metadata = translator.translate(text = text, dest = dest, src = src or 'auto')
+    return {"translated-text" : translation_metadata.text, "src" : translation_metadata.src, "time" : time.time() - start_time}
@@ -0,0 +1,61 @@
+from flask import Request, current_app
+from werkzeug.exceptions import BadRequest
+from tempfile import SpooledTemporaryFile
+from typing import IO, Iterator, Optional
+import hashlib
+import os
+import struct
+
+class BoundedSpool(SpooledTemporaryFile):
+    '''Bounded, self-cleaning spool for uploaded files. The whole file is buffered before the request is handled,
+    in memory up to spool_size and in an anonymous temporary file (deleted on close) beyond that,
+    rejecting the upload as soon as more than max_size bytes are read from the request stream.
+    The SHA-256 digest of the contents is computed as they are written, avoiding another pass over the file.
+    The file is not streamed through to AssemblyAI, as its digest must be known before deciding whether to upload it at all'''
+
+    def __init__(self, max_size : int, spool_size : int) -> None:
+        super().__init__(max_size=spool_size, mode="w+b")
+        self.limit = max_size
+        self.bytes_written = 0
+        self._digest = hashlib.sha256()
+
+    def write(self, s : bytes) -> int:
+        self.bytes_written += len(s)
+        if self.bytes_written > self.limit:
+            raise BadRequest("Very large file, cannot process!")
+        self._digest.update(s)
+        return super().write(s)
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+class Babel_Request(Request):
+    '''Request class spooling multipart file parts into size-bounded buffers instead of werkzeug's unbounded temporary files'''
+
+    def _get_file_stream(self, total_content_length : Optional[int], content_type : Optional[str], filename : Optional[str] = None, content_length : Optional[int] = None) -> IO[bytes]:
+        return BoundedSpool(max_size=self.max_audio_size, spool_size=self.spool_size)
+
+    @property
+    def max_audio_size(self) -> int:
+        return current_app.config["MAX_AUDIO_SIZE"]
+
+    @property
+    def spool_size(self) -> int:
+        return current_app.config["AUDIO_SPOOL_SIZE"]
+
+def estimate_duration(stream : IO[bytes], bitrate : int) -> Optional[float]:
+    '''Estimate the duration in seconds of spooled audio, read from the byte rate in WAV headers and assumed from the given bitrate (bits per second) otherwise'''
+    size : int = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+    header : bytes = stream.read(32)
+    stream.seek(0)
+    if len(header) == 32 and header[:4] == b"RIFF" and header[8:12] == b"WAVE" and header[12:16] == b"fmt ":
+        byte_rate : int = struct.unpack_from("<I", header, 28)[0]
+        return size / byte_rate if byte_rate else None
+    return size * 8 / bitrate if bitrate > 0 else None
+
+def iter_chunks(stream : IO[bytes], chunk_size : int = 64*1024) -> Iterator[bytes]:
+    '''Yield a (spooled) stream in fixed-size chunks, starting from its beginning'''
+    stream.seek(0)
+    while chunk := stream.read(chunk_size):
+        yield chunk
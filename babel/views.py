@@ -1,9 +1,10 @@
-from babel import app, db, RedisManager
+from babel import app, read_session, RedisManager
 from babel.models import User
+from babel.counters import merge_pending_usage, pending_usage
 from flask import render_template, request, make_response
 from sqlalchemy import select
 from werkzeug.exceptions import NotFound
-from auxillary_packages.decorators import CSRF_protect
+from auxillary_packages.decorators import CSRF_protect, tolerates_cache_bypass
 import jwt
 import os
 from datetime import timedelta
@@ -38,11 +39,14 @@ def translate():
 
 @app.route("/dashboard", methods = ["GET"])
 @CSRF_protect
+@tolerates_cache_bypass
 def dashboard():
     username = request.args.get("user")
     cached_result = RedisManager.get(f"usr:{username}")
-    if cached_result:
-        user = orjson.loads(cached_result)
+    cached_user = orjson.loads(cached_result) if cached_result else None
+    # Records cached before user IDs were stored alongside them are treated as misses
+    if cached_user and "id" in cached_user:
+        user = merge_pending_usage(cached_user["id"], cached_user)
         return render_template("dashboard.html",
                             username = username,
                             time_created = user["time_created"],
@@ -54,7 +58,7 @@ def dashboard():
     if not username:
         raise NotFound("User not found! Make sure you've spelt their name right, and that this account actually exists")
 
-    user = db.session.execute(select(User).where(User.username == username, User.deleted == False)).scalar_one_or_none()
+    user = read_session.execute(select(User).where(User.username == username, User.deleted == False)).scalar_one_or_none()
         
     if not user:
         raise NotFound("This username is not registered with Babel. Make sure you spell it correctly, and that your queried username is actually registered. If you believe that this is your account, please contact support")
@@ -68,18 +72,20 @@ def dashboard():
                                 leeway=timedelta(minutes=3))
         isOwner = dTkn["sub"] == user.username
 
-    RedisManager.setex(f"usr:{username}", 180, orjson.dumps({"time_created" : user.time_created,
+    RedisManager.setex(f"usr:{username}", 180, orjson.dumps({"id" : user.id,
+                            "time_created" : user.time_created,
                             "last_login" : user.last_login,
                             "transcriptions" : user.transcriptions,
                             "translations" : user.translations,
                             "email_id" : user.email_id,
                             "isOwner" : isOwner}))
 
+    pending : dict = pending_usage(user.id)
     return render_template("dashboard.html",
                             username = username,
                             time_created = user.time_created,
                             last_login = user.last_login,
-                            transcriptions = user.transcriptions,
-                            translations = user.translations,
+                            transcriptions = user.transcriptions + pending["transcriptions"],
+                            translations = user.translations + pending["translations"],
                             email_id = user.email_id,
                             owner = isOwner)
@@ -3,9 +3,11 @@ import json
 from flask import Flask
 from babel_auth.config import flaskconfig, CWD
 from babel_auth.schema import TokenManager
+from auxillary_packages.json_provider import OrjsonProvider
 
 auth = Flask(__name__)
 auth.config.from_object(flaskconfig)
+auth.json = OrjsonProvider(auth)
 
 # Set up token manager
 with open(os.path.join(CWD, os.environ["ACCESS_SCHEMA_FP"]), "r") as accessSchema:
@@ -14,6 +16,7 @@ with open(os.path.join(CWD, os.environ["REFRESH_SCHEMA_FP"]), "r") as refreshSch
     refreshDict : dict = json.load(refreshSchema)
 tokenManager = TokenManager(signingKey=auth.config["SIGNING_KEY"],
                             accessSchema=accessDict,
-                            refreshSchema=refreshDict)
+                            refreshSchema=refreshDict,
+                            grace_window=auth.config["REFRESH_GRACE_WINDOW"])
 
 from babel_auth import routes
\ No newline at end of file
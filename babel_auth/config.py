@@ -26,6 +26,9 @@ class FlaskConfig:
         RESOURCE_SERVER_ORIGIN = os.environ["RS_DOMAIN"].lower()
         PROTOCOL = os.environ.get("RS_COMMUNICATION_PROTOCOL", "http").lower()
 
+        # Token metadata
+        REFRESH_GRACE_WINDOW = int(os.environ.get("REFRESH_GRACE_WINDOW", 10))
+
     except KeyError as e:
         raise Missing_Configuration_Error(f"FAILED TO SETUP CONFIGURATIONS FOR FLASK AUTH APPLICATION AS ENVIRONMENT VARIABLES WERE NOT FOUND (SEE: class Flask_Config at '{__file__}')")
     except TypeError as e:
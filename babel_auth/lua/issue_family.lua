@@ -0,0 +1,10 @@
+-- Start a new refresh token family with its first token
+-- KEYS[1]: S:{subject}
+-- ARGV[1]: family ID (16 bytes), ARGV[2]: jti (16 bytes) followed by exp (big-endian uint32) of the new refresh token, ARGV[3]: its exp as a UNIX timestamp
+-- Returns 1 if the family was created, 0 if it already exists
+if redis.call("HSETNX", KEYS[1], ARGV[1], ARGV[2]) == 0 then
+    return 0
+end
+-- Each family expires on its own, and the hash along with its last family
+redis.call("HEXPIREAT", KEYS[1], ARGV[3], "FIELDS", 1, ARGV[1])
+return 1
@@ -0,0 +1,12 @@
+-- Revoke every token family of a subject
+-- KEYS[1]: S:{subject}, KEYS[2]: SF:{subject}, indexing families still kept in the former format
+-- Returns the number of families revoked.
+-- Keys of families in the former format are derived from the index rather than passed in,
+-- which is fine for the single Redis instance backing the token store
+local revoked = redis.call("HLEN", KEYS[1])
+redis.call("DEL", KEYS[1])
+for _, fid in ipairs(redis.call("ZRANGE", KEYS[2], 0, -1)) do
+    revoked = revoked + redis.call("DEL", "FID:" .. fid)
+end
+redis.call("DEL", KEYS[2])
+return revoked
@@ -0,0 +1,47 @@
+-- Verify a presented refresh token against the latest token of its family, and rotate it for a new one
+-- KEYS[1]: S:{subject}, KEYS[2]: RR:{jti of the presented refresh token},
+-- KEYS[3]: FID:{family ID} and KEYS[4]: SF:{subject}, where the family and its index entry are kept in the former format
+-- ARGV[1]: family ID (16 bytes), ARGV[2]: jti (16 bytes) followed by exp (big-endian uint32) of the presented refresh token,
+-- ARGV[3]: the same for the new refresh token, ARGV[4]: exp of the new refresh token as a UNIX timestamp,
+-- ARGV[5]: grace window in seconds (0 to disable), ARGV[6]: the new token pair, kept under KEYS[2] for the grace window,
+-- ARGV[7]: "{jti}:{exp}" of the presented refresh token, ARGV[8]: family ID as hex, both as stored in the former format
+-- Returns 1 on rotation, 0 if the family does not exist, and -1 if the presented token is not the latest one.
+-- A stale token can only be presented by replaying it, so the whole family is revoked in that case,
+-- unless the token was rotated within the grace window, in which case the pair it was rotated for is returned instead
+local head = redis.call("HGET", KEYS[1], ARGV[1])
+local legacy = false
+if not head then
+    -- Families stored in the former format are verified against their list, and moved into the subject's hash once rotated
+    legacy = redis.call("LINDEX", KEYS[3], 0)
+    if not legacy then
+        return 0
+    end
+    if legacy == ARGV[7] then
+        head = ARGV[2]
+    else
+        head = legacy
+    end
+end
+local grace = tonumber(ARGV[5])
+if head ~= ARGV[2] then
+    if grace > 0 then
+        local rotated = redis.call("GET", KEYS[2])
+        if rotated then
+            return rotated
+        end
+    end
+    redis.call("HDEL", KEYS[1], ARGV[1])
+    redis.call("DEL", KEYS[3])
+    redis.call("ZREM", KEYS[4], ARGV[8])
+    return -1
+end
+if legacy then
+    redis.call("DEL", KEYS[3])
+    redis.call("ZREM", KEYS[4], ARGV[8])
+end
+redis.call("HSET", KEYS[1], ARGV[1], ARGV[3])
+redis.call("HEXPIREAT", KEYS[1], ARGV[4], "FIELDS", 1, ARGV[1])
+if grace > 0 and ARGV[6] ~= "" then
+    redis.call("SET", KEYS[2], ARGV[6], "EX", grace)
+end
+return 1
@@ -82,9 +82,15 @@ def login():
         break
     
     subject = valid.json()["sub"]
-    aToken = tokenManager.issueAccessToken(sub = subject)
+    # Numeric user ID, so that the resource server can key user data on integers instead of usernames
+    userClaims = {"uid" : valid.json()["uid"]}
+    # The access token carries its session's family ID, so that the session can be told apart from the user's others
+    familyID = tokenManager.generate_unique_identifier()
     rToken = tokenManager.issueRefreshToken(sub = subject,
-                                            firstTime=True)
+                                            additionalClaims = userClaims,
+                                            firstTime=True,
+                                            familyID=familyID)
+    aToken = tokenManager.issueAccessToken(sub = subject, additionalClaims = {"fid" : familyID, **userClaims})
 
     epoch = time.time()
     response = jsonify({
@@ -143,9 +149,15 @@ def register():
         break
     
     subject = valid.json()["sub"]
-    aToken = tokenManager.issueAccessToken(sub = subject)
+    # Numeric user ID, so that the resource server can key user data on integers instead of usernames
+    userClaims = {"uid" : valid.json()["uid"]}
+    # The access token carries its session's family ID, so that the session can be told apart from the user's others
+    familyID = tokenManager.generate_unique_identifier()
     rToken = tokenManager.issueRefreshToken(sub = subject,
-                                            firstTime=True)
+                                            additionalClaims = userClaims,
+                                            firstTime=True,
+                                            familyID=familyID)
+    aToken = tokenManager.issueAccessToken(sub = subject, additionalClaims = {"fid" : familyID, **userClaims})
     epoch = time.time()
     response = jsonify({
         "message" : "Registration complete, sign-in done.",
@@ -180,7 +192,11 @@ def register():
 @auth.route("/delete-account", methods = ["DELETE"])
 @private
 def deleteAccount():
-    tokenManager.invalidateFamily(request.headers["refreshID"])
+    # Every session of the deleted account is revoked, older resource servers only send the family of the deleting session
+    if request.headers.get("sub"):
+        tokenManager.invalidateAllFamilies(request.headers["sub"])
+    else:
+        tokenManager.invalidateFamily(request.headers["refreshID"])
     return jsonify({"message" : "resource deleted successfully"}), 204
 
 
@@ -242,12 +258,57 @@ def purgeFamily():
                                    options={"verify_nbf" : False})
     if not tkn:
         raise BadRequest(f"Invalid Refresh Token provided to [{request.method}] {request.url_rule}")
-    tokenManager.invalidateFamily(tkn['fid'])
+    tokenManager.invalidateFamily(tkn['fid'], tkn['sub'])
     response : Response = jsonify({"message" : "Token Revoked"})
     response.headers["iss"] = "babel-auth-service"
     return response, 204
 
 
+def sessionOwner() -> dict:
+    '''Decoded access token of the request, identifying whose sessions are being managed'''
+    tkn = request.cookies.get("access", request.cookies.get("Access"))
+    if not tkn:
+        raise Unauthorized("Managing sessions requires an access token")
+    try:
+        return tokenManager.decodeToken(tkn, tType="access", options={"require" : ["exp", "sub"]})
+    except JWT_exc.ExpiredSignatureError as e:
+        raise e
+    except JWT_exc.PyJWTError:
+        raise Unauthorized("Invalid access token")
+
+@auth.route("/sessions", methods = ["GET", "OPTIONS"])
+@attach_CORS_headers
+@CSRF_protect
+def listSessions():
+    owner : dict = sessionOwner()
+    return jsonify({"sessions" : [{"fid" : fid, "expires" : exp, "current" : fid == owner.get("fid")}
+                                  for fid, exp in tokenManager.activeFamilies(owner["sub"])]}), 200
+
+@auth.route("/sessions/<string:fid>", methods = ["DELETE", "OPTIONS"])
+@attach_CORS_headers
+@CSRF_protect
+def revokeSession(fid):
+    owner : dict = sessionOwner()
+    if not tokenManager.ownsFamily(owner["sub"], fid):
+        raise NotFound()
+    tokenManager.invalidateFamily(fid, owner["sub"])
+    response : Response = jsonify({"message" : "Session Revoked"})
+    response.headers["iss"] = "babel-auth-service"
+    return response, 204
+
+@auth.route("/sessions", methods = ["DELETE"])
+@attach_CORS_headers
+@CSRF_protect
+def revokeAllSessions():
+    '''
+    Logs the user out everywhere, including the requesting session
+    '''
+    owner : dict = sessionOwner()
+    revoked : int = tokenManager.invalidateAllFamilies(owner["sub"])
+    response : Response = jsonify({"message" : "Sessions Revoked", "revoked" : revoked})
+    response.headers["iss"] = "babel-auth-service"
+    return response, 200
+
 @auth.route("/get-csrf", methods = ["OPTIONS", "GET"])
 @attach_CORS_headers
 def issueCSRF():
@@ -1,17 +1,35 @@
 import jwt
 from typing import Optional, Literal
 from auxillary_packages.errors import Missing_Configuration_Error, TOKEN_STORE_INTEGRITY_ERROR
-from auxillary_packages.RedisManager import REDIS_MANAGER
+from auxillary_packages.RedisManager import REDIS_MANAGER, connection_options_from_env
 from werkzeug.exceptions import InternalServerError
 import os
 import uuid
 import time
+import struct
 from typing import TypeAlias
 import jwt.exceptions as JWTexc
 
 # Aliases
 tokenPair : TypeAlias = tuple[str, str]
 
+# All token families of a subject are stored in a single hash under S:{subject}, mapping the family ID (16 bytes) to the
+# jti (16 bytes) and exp (big-endian uint32) of the family's latest refresh token. Each field expires along with its family (HEXPIREAT),
+# and at 16 + 20 bytes per field, hashes stay listpack encoded. Families stored in the former format, lists of "{jti}:{exp}"
+# under FID:{family ID} indexed by SF:{subject}, are moved into the hash on their next rotation.
+# Issuance and rotation each run as a single Lua script, so that concurrent rotations of one family cannot both pass the replay check
+LUA_DIR = os.path.join(os.path.dirname(__file__), "lua")
+
+def read_script(name : str) -> str:
+    with open(os.path.join(LUA_DIR, name), "r") as script:
+        return script.read()
+
+def pack_token(jti : str, exp : float) -> bytes:
+    return bytes.fromhex(jti) + struct.pack(">I", int(exp))
+
+def unpack_exp(packed : bytes) -> int:
+    return struct.unpack(">I", packed[16:])[0]
+
 class TokenManager:
     '''### Class for issuing and verifying access and refresh tokens assosciated with authentication and authorization
     
@@ -30,7 +48,7 @@ class TokenManager:
                  uClaims : dict = {"iss" : "babel-auth-service"},
                  uHeaders : dict | None = None,
                  leeway : int = 180,
-                 max_tokens_per_fid : int = 3):
+                 grace_window : int = 0):
         '''Initialize the token manager and set universal headers and claims, common to both access and refresh tokens
         
         params:
@@ -42,13 +60,18 @@ class TokenManager:
         alg (str): Algorithm to use for signing, universal to all tokens\n
         typ (str): Type of token being issued, universal to all tokens\n
         uClaims (dict-like): Universal claims to include for both access and refresh tokens\n
-        additonalHeaders (dict-like): Additional header information, universal to all tokens'''
+        additonalHeaders (dict-like): Additional header information, universal to all tokens\n
+        grace_window (int): Seconds after a rotation during which the rotated refresh token is answered with the pair it was rotated for, instead of being treated as replayed'''
 
         try:
             self._TokenStore = REDIS_MANAGER(os.environ["REDIS_HOST"],
                              os.environ["REDIS_PORT"],
-                             os.environ["REDIS_DB"])
-            self.max_llen = max_tokens_per_fid
+                             os.environ["REDIS_DB"],
+                             **connection_options_from_env())
+            self.graceWindow = grace_window
+            self._issueScript = self._TokenStore.load_script(read_script("issue_family.lua"))
+            self._rotateScript = self._TokenStore.load_script(read_script("rotate_family.lua"))
+            self._revokeSubjectScript = self._TokenStore.load_script(read_script("revoke_subject.lua"))
         except Exception as e:
             raise Missing_Configuration_Error("Mandatory configurations missing for _TokenStore") from e
 
@@ -85,7 +108,8 @@ class TokenManager:
                             options=kwargs.get('options'))
         except (JWTexc.ImmatureSignatureError, JWTexc.InvalidIssuedAtError, JWTexc.InvalidIssuerError) as e:
             if tType == "refresh":
-                self.invalidateFamily(jwt.decode(token, options={"verify_signature":False})["fid"])
+                unverifiedToken : dict = jwt.decode(token, options={"verify_signature":False})
+                self.invalidateFamily(unverifiedToken["fid"], unverifiedToken.get("sub"))
             raise TOKEN_STORE_INTEGRITY_ERROR("PP")
 
     def reissueTokenPair(self, rToken : str) -> tokenPair:
@@ -95,20 +119,28 @@ class TokenManager:
         
         aToken: JWT encoded access token\n
         rToken: JWT encoded refresh token'''
-        self.incrementActiveTokens()
         decodedRefreshToken = self.decodeToken(rToken, tType = "refresh")
-        self.revokeTokenWithIDs(decodedRefreshToken["jti"], decodedRefreshToken['fid'])
-
-        # issue tokens here
-        refreshToken = self.issueRefreshToken(decodedRefreshToken["sub"],
-                                              firstTime=False,
-                                              jti=decodedRefreshToken["jti"],
-                                              familyID=decodedRefreshToken["fid"],
-                                              exp=decodedRefreshToken["exp"])
+
+        # Duplicates of a reissue that already went through are answered with its pair, without signing one of their own
+        rotated = self.rotatedPair(decodedRefreshToken["sub"], decodedRefreshToken["jti"], decodedRefreshToken["fid"])
+        if rotated:
+            return rotated
+
+        # Tokens issued before user IDs were added as a claim carry none, and fail validation at the resource server
+        userClaims : dict = {"uid" : decodedRefreshToken["uid"]} if "uid" in decodedRefreshToken else {}
+        payload : dict = self.refreshPayload(decodedRefreshToken["sub"], userClaims, decodedRefreshToken["fid"])
+        refreshToken : str = self.encodeRefreshToken(payload)
         accessToken = self.issueAccessToken(decodedRefreshToken['sub'],
-                                            additionalClaims={"fid" : decodedRefreshToken["fid"]})
-        
-        return refreshToken, accessToken
+                                            additionalClaims={"fid" : decodedRefreshToken["fid"], **userClaims})
+
+        # The pair is signed before rotating, so that it can be stored for concurrent reissues of the same token in the same round trip.
+        # The script checks for a stored pair again, for duplicates that raced past the check above
+        rotated = self.rotateFamily(payload,
+                                    jti=decodedRefreshToken["jti"],
+                                    familyID=decodedRefreshToken["fid"],
+                                    exp=decodedRefreshToken["exp"],
+                                    pair=(refreshToken, accessToken))
+        return rotated or (refreshToken, accessToken)
 
     def issueRefreshToken(self, sub : str,
                           additionalClaims : Optional[dict] = None,
@@ -128,23 +160,24 @@ class TokenManager:
 
         jti: JTI claim of the current refresh token
 
-        familyID: FID claim of the current refresh token
+        familyID: FID claim of the current refresh token, or of the new family on first issuance (generated if not given)
+
+        exp: EXP claim of the current refresh token
         '''
-        # Check for replay attack
-        if not firstTime:
-            key = self._TokenStore.lindex(f"FID:{familyID}", 0)
-            if not key:
-                self.invalidateFamily(familyID)
-                raise TOKEN_STORE_INTEGRITY_ERROR(f"Token family {familyID} is invalid or empty")
-            key_metadata = key.split(":")
-            if key_metadata[0] != jti or float(key_metadata[1]) != exp:
-                self.invalidateFamily(familyID)
-                raise TOKEN_STORE_INTEGRITY_ERROR(f"Replay attack detected or token metadata mismatch for family {familyID}")
-
-        elif self._TokenStore.get(f"FID{familyID}"):
-            self.invalidateFamily(familyID)
-            raise TOKEN_STORE_INTEGRITY_ERROR(f"Token family {familyID} already exists, cannot issue a new token with the same family")
+        payload : dict = self.refreshPayload(sub, additionalClaims, familyID)
+        if firstTime:
+            if not self._TokenStore.evalsha(self._issueScript,
+                                            (f"S:{sub}",),
+                                            (bytes.fromhex(payload["fid"]), pack_token(payload["jti"], payload["exp"]), int(payload["exp"]))):
+                raise TOKEN_STORE_INTEGRITY_ERROR(f"Token family {payload['fid']} already exists, cannot issue a new token with the same family")
+            self.incrementActiveTokens()
+        else:
+            self.rotateFamily(payload, jti, familyID, exp)
 
+        return self.encodeRefreshToken(payload)
+
+    def refreshPayload(self, sub : str, additionalClaims : Optional[dict] = None, familyID : Optional[str] = None) -> dict:
+        '''Claims of a new refresh token, starting a new family unless familyID is given'''
         payload : dict = {"iat" : time.time(),
                           "exp" : time.time() + self.refreshLifetime,
                           "nbf" : time.time() + self.accessLifetime - self.leeway,
@@ -154,20 +187,48 @@ class TokenManager:
         payload.update(self.uClaims)
         if additionalClaims:
             payload.update(additionalClaims)
+        payload["fid"] = familyID or self.generate_unique_identifier()
+        return payload
 
-        if firstTime:
-            payload["fid"] = self.generate_unique_identifier()
-        else:
-            payload["fid"] = familyID
-
-        self._TokenStore.lpush(f"FID:{payload['fid']}", f"{payload['jti']}:{payload['exp']}")
-        self._TokenStore.expireat(f"FID:{payload['fid']}", int(payload["exp"]))
-
+    def encodeRefreshToken(self, payload : dict) -> str:
         return jwt.encode(payload=payload,
                           key=self.signingKey,
                           algorithm=self.refreshHeaders["alg"],
                           headers=self.refreshHeaders)
 
+    def rotateFamily(self, payload : dict, jti : str, familyID : str, exp : float, pair : Optional[tokenPair] = None) -> Optional[tokenPair]:
+        '''Replace the refresh token (jti, exp) at the head of its family with the one described by payload, in a single atomic round trip.
+        If that token was already rotated within the grace window, returns the pair it was rotated for instead of revoking the family.
+        pair, if given, is the new token pair kept for such duplicate rotations'''
+        # Check for replay attack and rotate, the script revokes the family itself on a mismatch
+        rotated = self._TokenStore.evalsha(self._rotateScript,
+                                           (f"S:{payload['sub']}", f"RR:{jti}", f"FID:{familyID}", f"SF:{payload['sub']}"),
+                                           (bytes.fromhex(familyID), pack_token(jti, exp), pack_token(payload["jti"], payload["exp"]), int(payload["exp"]),
+                                            self.graceWindow if pair else 0, " ".join(pair) if pair else "",
+                                            f"{jti}:{exp}", familyID))
+        if isinstance(rotated, bytes):
+            # JWTs contain no spaces
+            refreshToken, accessToken = rotated.decode().split(" ")
+            return refreshToken, accessToken
+        if rotated == 0:
+            raise TOKEN_STORE_INTEGRITY_ERROR(f"Token family {familyID} is invalid or empty")
+        if rotated == -1:
+            self.decrementActiveTokens()
+            raise TOKEN_STORE_INTEGRITY_ERROR(f"Replay attack detected or token metadata mismatch for family {familyID}")
+        return None
+
+    def rotatedPair(self, sub : str, jti : str, familyID : str) -> Optional[tokenPair]:
+        '''Pair the given refresh token was rotated for within the grace window, provided its family has not been revoked since'''
+        if not self.graceWindow:
+            return None
+        with self._TokenStore.pipeline() as pipeline:
+            pipeline.get(f"RR:{jti}")
+            pipeline.hexists(f"S:{sub}", bytes.fromhex(familyID))
+        if not (pipeline.results and pipeline.results[0] and pipeline.results[1]):
+            return None
+        refreshToken, accessToken = pipeline.results[0].decode().split(" ")
+        return refreshToken, accessToken
+
     def issueAccessToken(self, sub : str, 
                          additionalClaims : Optional[dict] = None) -> str:
         payload : dict = {"iat" : time.time(),
@@ -184,38 +245,57 @@ class TokenManager:
                           algorithm=self.accessHeaders["alg"],
                           headers=self.accessHeaders)
 
-    def revokeTokenWithIDs(self, jti : str, fID : str) -> None:
-        '''Revokes a refresh token using JTI and FID claims, without invalidating the family'''
+    def invalidateFamily(self, fID : str, sub : Optional[str] = None) -> None:
+        '''Remove entire token family from revocation list and token store. Only families in the former format can be found without their subject'''
         try:
-            llen = self._TokenStore.llen(f"FID:{fID}")
-
-            if llen == 0:
-                return "Key does not exist"
-            
-            if llen >= self.max_llen:
-                self._TokenStore.rpop(f"FID:{fID}", max(1, llen-self.max_llen))
-
-            self.decrementActiveTokens()
-        except ValueError as e:
-            print("Number of active tokens must be non-negative integer")
+            with self._TokenStore.pipeline(transaction=True) as pipeline:
+                pipeline.delete(f"FID:{fID}")
+                if sub:
+                    pipeline.hdel(f"S:{sub}", bytes.fromhex(fID))
+                    pipeline.zrem(f"SF:{sub}", fID)
+            if any(pipeline.results[:2]):
+                self.decrementActiveTokens()
+            else:
+                print("No Family Found")
         except Exception as e:
             raise InternalServerError("Failed to perform operation on token store")
 
-    def invalidateFamily(self, fID : str) -> None:
-        '''Remove entire token family from revocation list and token store'''
+    def invalidateAllFamilies(self, sub : str) -> int:
+        '''Revoke every token family of a subject in a single round trip, returns the number of families revoked'''
         try:
-            if self._TokenStore.get(f"FID:{fID}"):
-                self._TokenStore.delete(f"FID:{fID}")
-                self.decrementActiveTokens()
-            else:
-                print("No Family Found")
+            revoked : int = self._TokenStore.evalsha(self._revokeSubjectScript, (f"S:{sub}", f"SF:{sub}"), ())
         except Exception as e:
             raise InternalServerError("Failed to perform operation on token store")
+        for _ in range(revoked):
+            self.decrementActiveTokens()
+        return revoked
+
+    def activeFamilies(self, sub : str) -> list[tuple[str, float]]:
+        '''Unexpired token families of a subject as (family ID, expiry), most recently rotated first'''
+        with self._TokenStore.pipeline() as pipeline:
+            pipeline.hgetall(f"S:{sub}")
+            pipeline.zrangebyscore(f"SF:{sub}", time.time(), "+inf", withscores=True)
+        families, legacyFamilies = pipeline.results
+        active : list[tuple[str, float]] = [(fID.hex(), unpack_exp(packed)) for fID, packed in families.items()]
+        active.extend((fID.decode(), exp) for fID, exp in legacyFamilies)
+        return sorted(active, key=lambda family : family[1], reverse=True)
+
+    def ownsFamily(self, sub : str, fID : str) -> bool:
+        try:
+            packedID : bytes = bytes.fromhex(fID)
+        except ValueError:
+            return False
+        with self._TokenStore.pipeline() as pipeline:
+            pipeline.hexists(f"S:{sub}", packedID)
+            pipeline.zscore(f"SF:{sub}", fID)
+        return bool(pipeline.results[0]) or pipeline.results[1] is not None
 
     @staticmethod
     def decrementActiveTokens():
+        # Families issued by other processes are not counted by this one
         if TokenManager.activeRefreshTokens == 0:
-            raise ValueError("Active refresh tokens cannot be a negative number")
+            print("Number of active tokens must be non-negative integer")
+            return
         TokenManager.activeRefreshTokens -= 1
 
     @staticmethod
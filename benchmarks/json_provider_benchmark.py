@@ -0,0 +1,50 @@
+'''Micro-benchmark for building JSON responses through Flask's default (stdlib json) provider versus OrjsonProvider
+
+Payloads are shaped like history entries, the heaviest JSON the resource server builds.
+
+Usage (from the repository root):
+$ python -m benchmarks.json_provider_benchmark --rows 10 1000 --iterations 2000
+'''
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from auxillary_packages.json_provider import OrjsonProvider
+
+def history_payload(rows : int) -> list[dict]:
+    start = datetime(2024, 1, 1)
+    return [{"id" : i,
+             "time_requested" : start + timedelta(seconds=i),
+             "content" : "Python boasts a lot of features like subpar performance, lack of static typing, and forced indentation",
+             "lang" : None,
+             "type" : "translation",
+             "src" : "en",
+             "dst" : "fr"} for i in range(rows)]
+
+def run(label : str, app : Flask, payload : list[dict], iterations : int) -> float:
+    with app.app_context():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            app.json.response(payload).get_data()
+        elapsed = (time.perf_counter() - start) / iterations
+    print(f"{label:<10} rows={len(payload):<6} {elapsed*1e6:>10.1f}us/response")
+    return elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 1000])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    stdlibApp = Flask("stdlib")
+    stdlibApp.json = DefaultJSONProvider(stdlibApp)
+    orjsonApp = Flask("orjson")
+    orjsonApp.json = OrjsonProvider(orjsonApp)
+
+    for rows in args.rows:
+        payload = history_payload(rows)
+        stdlib = run("stdlib", stdlibApp, payload, args.iterations)
+        fast = run("orjson", orjsonApp, payload, args.iterations)
+        print(f"{'speedup':<10} rows={rows:<6} {stdlib/fast:>10.1f}x")
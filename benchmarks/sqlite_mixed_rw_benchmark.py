@@ -0,0 +1,96 @@
+'''Benchmark for mixed read/write throughput on SQLite, default settings versus production storage mode (WAL, tuned pragmas, read-only engine for readers)
+
+Writers insert history rows and commit one at a time, like /translate. Readers run the keyset history query of /fetch-history.
+
+Usage (from the repository root):
+$ python -m benchmarks.sqlite_mixed_rw_benchmark --readers 8 --writers 2 --duration 5
+'''
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text, Engine
+from sqlalchemy.exc import OperationalError
+from auxillary_packages.sqlite_tuning import production_pragmas, read_only_pragmas, apply_pragmas, read_only_uri
+
+USERS = 100
+
+SCHEMA = ["CREATE TABLE translations (id INTEGER PRIMARY KEY, requested_by INTEGER NOT NULL, translated_text TEXT NOT NULL, time_requested DATETIME NOT NULL)",
+          "CREATE INDEX ix_translations_requested_by_time_requested_id ON translations (requested_by, time_requested, id)"]
+
+INSERT = text("INSERT INTO translations (requested_by, translated_text, time_requested) VALUES (:uid, :text, :time)")
+PAGE = text("SELECT id, time_requested, translated_text FROM translations WHERE requested_by = :uid ORDER BY time_requested DESC, id DESC LIMIT 11")
+
+def seed(engine : Engine, rows : int) -> None:
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        for statement in SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(INSERT, [{"uid" : i % USERS, "text" : "lorem ipsum " * 8, "time" : start + timedelta(seconds=i)} for i in range(rows)])
+
+def worker(engine : Engine, statement, write : bool, deadline : float, latencies : list, errors : list) -> None:
+    while time.perf_counter() < deadline:
+        params = {"uid" : random.randrange(USERS)}
+        if write:
+            params.update({"text" : "lorem ipsum " * 8, "time" : datetime.now()})
+        start = time.perf_counter()
+        try:
+            with engine.begin() if write else engine.connect() as connection:
+                result = connection.execute(statement, params)
+                if not write:
+                    result.all()
+        except OperationalError:
+            errors.append(1)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+def run(label : str, writeEngine : Engine, readEngine : Engine, readers : int, writers : int, duration : float) -> None:
+    reads, writes, errors = [], [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=worker, args=(readEngine, PAGE, False, deadline, reads, errors)) for _ in range(readers)]
+    threads += [threading.Thread(target=worker, args=(writeEngine, INSERT, True, deadline, writes, errors)) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for kind, latencies in (("reads", reads), ("writes", writes)):
+        latencies.sort()
+        p95 = latencies[int(len(latencies)*0.95) - 1]*1000 if latencies else float("nan")
+        mean = statistics.mean(latencies)*1000 if latencies else float("nan")
+        print(f"{label:<12} {kind:<7} {len(latencies)/duration:>9.0f} ops/s  mean={mean:.2f}ms  p95={p95:.2f}ms")
+    print(f"{label:<12} errors  {len(errors)}")
+
+def main(readers : int, writers : int, duration : float, rows : int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "default.db")
+        # Matches the resource server's development mode: one engine, rollback journal
+        engine = create_engine("sqlite:///" + path, pool_size=readers + writers)
+        seed(engine, rows)
+        run("default", engine, engine, readers, writers, duration)
+        engine.dispose()
+
+        path = os.path.join(directory, "production.db")
+        pragmas = production_pragmas()
+        writeEngine = create_engine("sqlite:///" + path, pool_size=writers)
+        apply_pragmas(writeEngine, pragmas)
+        seed(writeEngine, rows)
+        readEngine = create_engine(read_only_uri(path), pool_size=readers, max_overflow=0)
+        apply_pragmas(readEngine, read_only_pragmas(pragmas))
+        run("production", writeEngine, readEngine, readers, writers, duration)
+        writeEngine.dispose()
+        readEngine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+    main(args.readers, args.writers, args.duration, args.rows)
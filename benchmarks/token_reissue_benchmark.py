@@ -0,0 +1,121 @@
+'''Benchmark for refresh token rotation under concurrency, the former sequence of separate commands
+(LLEN + RPOP, then LINDEX + LPUSH + EXPIREAT) versus the single EVALSHA of babel_auth/lua/rotate_family.lua.
+
+Also counts how many of several simultaneous rotations of the same token pass the replay check, which should only ever be one.
+Families start out in the former format (FID:{family ID} lists), which the script moves into the compact S:{subject} hash
+on their first rotation. Each family gets a subject of its own (bench-{family ID}), and all keys are deleted afterwards.
+
+Usage (from the repository root, requires a running Redis server):
+$ python -m benchmarks.token_reissue_benchmark --port 6379 --families 64 --rotations 200 --threads 16
+'''
+import argparse
+import os
+import threading
+import time
+import struct
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from auxillary_packages.RedisManager import REDIS_MANAGER
+
+LUA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "babel_auth", "lua")
+MAX_LLEN = 3
+LIFETIME = 3600
+
+def read_script(name : str) -> str:
+    with open(os.path.join(LUA_DIR, name), "r") as script:
+        return script.read()
+
+def new_entry() -> tuple[str, float]:
+    exp = time.time() + LIFETIME
+    return f"{uuid.uuid4().hex}:{exp}", exp
+
+def pack(entry : str) -> bytes:
+    '''"{jti}:{exp}" in the compact format, 16 bytes of jti followed by exp as a big-endian uint32'''
+    jti, exp = entry.split(":")
+    return bytes.fromhex(jti) + struct.pack(">I", int(float(exp)))
+
+def legacy_rotate(store : REDIS_MANAGER, fid : str, presented : str) -> Optional[str]:
+    '''Returns the entry of the new token, or None if the presented one was rejected'''
+    key = f"FID:{fid}"
+    llen = store.llen(key)
+    if llen >= MAX_LLEN:
+        store.rpop(key, max(1, llen - MAX_LLEN))
+    head = store.lindex(key, 0)
+    if head != presented:
+        store.delete(key)
+        return None
+    entry, exp = new_entry()
+    store.lpush(key, entry)
+    store.expireat(key, int(exp))
+    return entry
+
+def scripted_rotate_factory(store : REDIS_MANAGER):
+    sha = store.load_script(read_script("rotate_family.lua"))
+    def scripted_rotate(store : REDIS_MANAGER, fid : str, presented : str) -> Optional[str]:
+        entry, exp = new_entry()
+        if store.evalsha(sha,
+                         (f"S:bench-{fid}", f"RR:{presented.split(':')[0]}", f"FID:{fid}", f"SF:bench-{fid}"),
+                         (bytes.fromhex(fid), pack(presented), pack(entry), int(exp), 0, "", presented, fid)) != 1:
+            return None
+        return entry
+    return scripted_rotate
+
+def start_family(store : REDIS_MANAGER) -> tuple[str, str]:
+    fid = uuid.uuid4().hex
+    entry, exp = new_entry()
+    store.lpush(f"FID:{fid}", entry)
+    store.expireat(f"FID:{fid}", int(exp))
+    return fid, entry
+
+def run_throughput(label : str, store : REDIS_MANAGER, rotate, families : int, rotations : int, threads : int) -> None:
+    chains = [start_family(store) for _ in range(families)]
+
+    def rotate_chain(chain : tuple[str, str]) -> int:
+        fid, entry = chain
+        for _ in range(rotations):
+            entry = rotate(store, fid, entry)
+            if not entry:
+                return 0
+        return rotations
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        completed = sum(executor.map(rotate_chain, chains))
+    elapsed = time.perf_counter() - start
+    store.delete(*(key for fid, _ in chains for key in (f"FID:{fid}", f"S:bench-{fid}", f"SF:bench-{fid}")))
+    print(f"{label:<9} rotations={completed:<7} {completed/elapsed:>10.0f} rotations/s {elapsed/max(completed, 1)*1e6:>8.1f}us/rotation")
+
+def run_race(label : str, store : REDIS_MANAGER, rotate, contenders : int, trials : int) -> None:
+    '''Present the same token from several threads at once, counting trials in which more than one rotation succeeded'''
+    doubled = 0
+    for _ in range(trials):
+        fid, entry = start_family(store)
+        barrier = threading.Barrier(contenders)
+        def contend(_) -> bool:
+            barrier.wait()
+            return bool(rotate(store, fid, entry))
+        with ThreadPoolExecutor(max_workers=contenders) as executor:
+            if sum(executor.map(contend, range(contenders))) > 1:
+                doubled += 1
+        store.delete(f"FID:{fid}", f"S:bench-{fid}", f"SF:bench-{fid}")
+    print(f"{label:<9} trials={trials} trials with more than one successful rotation: {doubled}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=0)
+    parser.add_argument("--families", type=int, default=64)
+    parser.add_argument("--rotations", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--race-trials", type=int, default=200)
+    args = parser.parse_args()
+
+    store = REDIS_MANAGER(args.host, args.port, args.db, max_connections=max(args.threads, 4) * 2)
+    scripted_rotate = scripted_rotate_factory(store)
+    run_throughput("legacy", store, legacy_rotate, args.families, args.rotations, args.threads)
+    run_throughput("scripted", store, scripted_rotate, args.families, args.rotations, args.threads)
+    run_race("legacy", store, legacy_rotate, 4, args.race_trials)
+    run_race("scripted", store, scripted_rotate, 4, args.race_trials)
@@ -0,0 +1,84 @@
+'''Benchmark for memory used per session by the token store, the former layout (a FID:{family ID} list of "{jti}:{exp}" strings
+per family, indexed by an SF:{subject} sorted set) versus the compact one (a single S:{subject} hash of 16-byte family IDs
+mapped to 16-byte jti + uint32 exp, with per-field expiry).
+
+Fills the given Redis database with synthetic sessions, reports used memory per session and the encoding of a sample key,
+then flushes the database. The database must be empty to begin with, and the compact layout requires Redis 7.4 or higher.
+
+Usage (from the repository root, requires a running Redis server):
+$ python -m benchmarks.token_store_memory_benchmark --port 6379 --db 15 --millions 1 --sessions-per-user 2
+'''
+import argparse
+import struct
+import time
+import uuid
+
+from redis import Redis
+
+LIFETIME = 7 * 24 * 3600
+
+def token_entry(exp : float) -> tuple[str, bytes]:
+    jti = uuid.uuid4()
+    return f"{jti.hex}:{exp}", jti.bytes + struct.pack(">I", int(exp))
+
+def fill(client : Redis, layout : str, sessions : int, sessions_per_user : int, tokens_per_family : int, batch : int) -> str:
+    '''Write the given number of sessions, returns a sample key'''
+    pipeline = client.pipeline(transaction=False)
+    for user in range(sessions // sessions_per_user):
+        sub = f"user{user}"
+        families : dict[bytes, bytes] = {}
+        expiries : list[float] = []
+        for _ in range(sessions_per_user):
+            fid = uuid.uuid4()
+            exp = time.time() + LIFETIME
+            entries = [token_entry(exp) for _ in range(tokens_per_family)]
+            expiries.append(exp)
+            if layout == "legacy":
+                pipeline.rpush(f"FID:{fid.hex}", *(entry for entry, _ in entries))
+                pipeline.expireat(f"FID:{fid.hex}", int(exp))
+                pipeline.zadd(f"SF:{sub}", {fid.hex : exp})
+            else:
+                # Only the latest token of a family is kept
+                families[fid.bytes] = entries[0][1]
+
+        if layout == "legacy":
+            pipeline.expireat(f"SF:{sub}", int(max(expiries)))
+        else:
+            pipeline.hset(f"S:{sub}", mapping=families)
+            pipeline.execute_command("HEXPIREAT", f"S:{sub}", int(max(expiries)), "FIELDS", len(families), *families)
+        if user % batch == batch - 1:
+            pipeline.execute()
+    pipeline.execute()
+    return "SF:user0" if layout == "legacy" else "S:user0"
+
+def run(client : Redis, layout : str, sessions : int, sessions_per_user : int, tokens_per_family : int, batch : int) -> None:
+    before = client.info("memory")["used_memory"]
+    start = time.perf_counter()
+    sample = fill(client, layout, sessions, sessions_per_user, tokens_per_family, batch)
+    elapsed = time.perf_counter() - start
+    used = client.info("memory")["used_memory"] - before
+    encoding = client.object("encoding", sample)
+    print(f"{layout:<8} sessions={sessions:<9} keys={client.dbsize():<9} {used/sessions:>7.1f} bytes/session "
+          f"total={used/2**20:>8.1f}MiB sample={sample} ({encoding.decode() if isinstance(encoding, bytes) else encoding}) filled in {elapsed:.1f}s")
+    client.flushdb()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=15)
+    parser.add_argument("--millions", type=float, default=1, help="Number of sessions (token families) to create, in millions")
+    parser.add_argument("--sessions-per-user", type=int, default=2)
+    parser.add_argument("--tokens-per-family", type=int, default=3, help="Tokens kept per family in the former layout")
+    parser.add_argument("--batch", type=int, default=10000, help="Users written per pipeline round trip")
+    parser.add_argument("--layout", choices=["legacy", "compact", "both"], default="both")
+    args = parser.parse_args()
+
+    client = Redis(host=args.host, port=args.port, db=args.db)
+    if client.dbsize():
+        raise SystemExit(f"Database {args.db} is not empty, refusing to fill (and flush) it")
+
+    # Rounded down to whole users
+    sessions = int(args.millions * 1_000_000) // args.sessions_per_user * args.sessions_per_user
+    for layout in (("legacy", "compact") if args.layout == "both" else (args.layout,)):
+        run(client, layout, sessions, args.sessions_per_user, args.tokens_per_family, args.batch)
@@ -0,0 +1,47 @@
+'''Micro-benchmark for per-call translation latency, building a new Translator per call versus borrowing one from TranslatorPool
+
+Usage (from the repository root, requires network access to Google Translate):
+$ python -m benchmarks.translator_pool_benchmark --calls 50 --threads 4
+'''
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from googletrans import Translator
+from auxillary_packages.TranslatorPool import TranslatorPool
+
+PHRASES = ["Good morning", "Where is the station?", "Thank you very much", "How much does this cost?", "See you tomorrow"]
+
+def fresh_client_call(i : int) -> float:
+    start = time.perf_counter()
+    Translator().translate(PHRASES[i % len(PHRASES)], dest="fr", src="en")
+    return time.perf_counter() - start
+
+def pooled_call_factory(pool : TranslatorPool):
+    def pooled_call(i : int) -> float:
+        start = time.perf_counter()
+        with pool.borrow() as translator:
+            translator.translate(PHRASES[i % len(PHRASES)], dest="fr", src="en")
+        return time.perf_counter() - start
+    return pooled_call
+
+def run(label : str, call, calls : int, threads : int) -> None:
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(call, range(calls)))
+    print(f"{label:<10} calls={calls} mean={statistics.mean(latencies)*1000:.1f}ms "
+          f"p50={latencies[len(latencies)//2]*1000:.1f}ms p95={latencies[int(len(latencies)*0.95)-1]*1000:.1f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    pool = TranslatorPool(factory=Translator, size=args.threads)
+    # Warm the pool up, as a long-running worker would be
+    run("warmup", pooled_call_factory(pool), args.threads, args.threads)
+
+    run("before", fresh_client_call, args.calls, args.threads)
+    run("after", pooled_call_factory(pool), args.calls, args.threads)
+    print(f"pool stats: {pool.stats()}")